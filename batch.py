@@ -0,0 +1,215 @@
+"""Headless batch export.
+
+Runs the LasarusResults pipeline for every combination of workbook, sheet
+and date range in a process pool, exporting all selected tests from one
+scan of the sheet, for example:
+
+    python batch.py exports/*.xlsx --test "Соціоніка" --sheet "Лист1" \
+        --range 2024-01-01:2024-01-31 --output-dir reports
+
+--engine csv, jsonl or html writes plain reports instead of .docx.
+--merge writes one report per test, sheet and date range from all the
+workbooks, such as monthly exports, dropping results found in several.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from itertools import product
+from urllib.request import pathname2url
+from lasarus import LasarusResults, ENGINES, safe_file_name, unique_file_name
+from readers import list_sheets
+from run_stats import report_file_name
+
+
+def load_structures(db_path=None, config_path=None):
+    """Returns {test name: structure} from a JSON config or the TestStructures table."""
+    if config_path:
+        with open(config_path, encoding="utf-8") as f:
+            items = json.load(f)
+        return {item['name']: {
+            'name_column': item['name_column'],
+            'date_column': item['date_column'],
+            'data_columns': item['data_columns'],
+        } for item in items}
+
+    # Read-only, so a wrong path is reported instead of creating an empty database
+    if not os.path.isfile(db_path):
+        raise SystemExit(f"Database not found: {db_path} (use --db or --config)")
+    try:
+        conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("SELECT Name, NameColumn, DateColumn, DataColumn FROM TestStructures").fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        raise SystemExit(f"Cannot read TestStructures from {db_path}: {e}")
+    return {row[0]: {'name_column': row[1], 'date_column': row[2], 'data_columns': row[3]} for row in rows}
+
+
+def parse_range(text):
+    date_from, _, date_to = text.partition(":")
+    date_from = datetime.strptime(date_from, "%Y-%m-%d")
+    date_to = datetime.strptime(date_to, "%Y-%m-%d").replace(hour=23, minute=59, second=59, microsecond=999999)
+    return date_from, date_to
+
+
+def parse_shard_by(text):
+    if text in ("month", "year"):
+        return text
+    if not text.isdigit() or int(text) < 1:
+        raise argparse.ArgumentTypeError(f"expected month, year or a number of results: {text}")
+    return int(text)
+
+
+def output_file_name(output_dir, workbook, test_name, sheet_name, date_range, extension=".docx"):
+    stem = os.path.splitext(os.path.basename(workbook))[0]
+    parts = [test_name, stem, sheet_name]
+    if date_range:
+        parts.append(f"{date_range[0]:%Y-%m-%d}_{date_range[1]:%Y-%m-%d}")
+    return os.path.join(output_dir, safe_file_name(" - ".join(parts) + extension))
+
+
+def run_job(job):
+    """Runs one export in a worker process and returns its summary."""
+    summary = dict(job, status="ok", results=0, error_rows=0, message="")
+    started = time.perf_counter()
+    date_from, date_to = job['date_range'] or (None, None)
+    try:
+        # A merged job opens its workbooks in the worker processes
+        lasarus_results = LasarusResults(None if job['merge'] else job['workbook'], date_from, date_to)
+        lasarus_results.template = job['template']
+        if job['max_memory']:
+            lasarus_results.max_memory = job['max_memory'] * 1024 * 1024
+        if job['merge']:
+            # Merged jobs run one by one, each reads its workbooks in parallel
+            sources = [(workbook, job['sheet']) for workbook in job['workbooks']]
+            counts = lasarus_results.save_merged_results(sources, job['outputs'], job['engine'], job['workers'])
+        else:
+            # Jobs already run in parallel, shards of one job are rendered in its own process
+            counts = lasarus_results.save_results_by_structures(job['sheet'], job['outputs'], job['engine'],
+                                                                shard_by=job['shard_by'], split=job['split'],
+                                                                workers=1)
+        summary['results'] = sum(counts)
+        summary['error_rows'] = len(lasarus_results.error_rows)
+        if job['report']:
+            lasarus_results.stats.write(report_file_name(job['outputs'][0][1], job['report']))
+    except Exception as e:
+        summary['status'] = "failed"
+        summary['message'] = str(e)
+    summary['seconds'] = time.perf_counter() - started
+    return summary
+
+
+def run_jobs(jobs, workers, merge=False):
+    """Yields the summary of every job as it finishes."""
+    if merge:
+        # The workbooks of a merged job are read by its own process pool
+        yield from map(run_job, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_job, job) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def build_jobs(args, structures):
+    tests = args.test or list(structures)
+    missing = [test for test in tests if test not in structures]
+    if missing:
+        raise SystemExit(f"Unknown tests: {', '.join(missing)}")
+    date_ranges = [parse_range(text) for text in args.range] or [None]
+
+    # All tests of one sheet and date range are exported from a single scan,
+    # merged jobs scan that sheet of every workbook
+    if args.merge:
+        workbook_groups = [("merged", args.workbooks)]
+    else:
+        workbook_groups = [(workbook, [workbook]) for workbook in args.workbooks]
+    jobs = []
+    used_file_names = set()
+    for workbook, workbooks in workbook_groups:
+        sheets = args.sheet or [name for name, _ in list_sheets(workbooks[0])]
+        for sheet_name, date_range in product(sheets, date_ranges):
+            jobs.append({
+                'workbook': workbook,
+                'workbooks': workbooks,
+                'merge': args.merge,
+                'workers': args.workers,
+                'tests': tests,
+                'sheet': sheet_name,
+                'date_range': date_range,
+                'engine': args.engine,
+                'report': args.report,
+                'template': args.template,
+                'shard_by': args.shard_by,
+                'split': args.split,
+                'max_memory': args.max_memory,
+                'outputs': [(structures[test_name],
+                             unique_file_name(output_file_name(args.output_dir, workbook, test_name, sheet_name,
+                                                               date_range, ENGINES[args.engine].extension),
+                                              used_file_names))
+                            for test_name in tests],
+            })
+    return jobs
+
+
+def print_summary(summary):
+    status = "OK  " if summary['status'] == "ok" else "FAIL"
+    date_range = summary['date_range']
+    line = (f"{status} {summary['seconds']:8.2f}s  results: {summary['results']:<7} "
+            f"error rows: {summary['error_rows']:<6} {', '.join(summary['tests'])} / {summary['sheet']} / "
+            f"{os.path.basename(summary['workbook'])}")
+    if date_range:
+        line += f" / {date_range[0]:%Y-%m-%d}..{date_range[1]:%Y-%m-%d}"
+    if summary['message']:
+        line += f"  ({summary['message']})"
+    print(line, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch export of Lasarus test results")
+    parser.add_argument("workbooks", nargs="+", help="source workbooks (.xlsx, .xls, .csv)")
+    parser.add_argument("--test", action="append", default=[], help="test name, all tests if omitted")
+    parser.add_argument("--sheet", action="append", default=[], help="sheet name, all sheets if omitted")
+    parser.add_argument("--range", action="append", default=[], metavar="FROM:TO",
+                        help="date range as YYYY-MM-DD:YYYY-MM-DD, all dates if omitted")
+    parser.add_argument("--db", default="app_data.db", help="database with the TestStructures table")
+    parser.add_argument("--config", help="JSON list of structures to use instead of the database")
+    parser.add_argument("--output-dir", default=".", help="where the reports are written")
+    parser.add_argument("--engine", choices=list(ENGINES), default="stream",
+                        help="docx or stream for Word documents, csv, jsonl or html for plain reports")
+    parser.add_argument("--template", help="report template .docx with the Lasarus styles")
+    parser.add_argument("--report", choices=["json", "csv"],
+                        help="write a run report (JSON) or the row errors (CSV) next to each job's first document")
+    parser.add_argument("--shard-by", type=parse_shard_by, metavar="month|year|N",
+                        help="render reports by month, year or N results at a time")
+    parser.add_argument("--split", action="store_true", help="save one document per shard")
+    parser.add_argument("--max-memory", type=int, metavar="MB",
+                        help="memory for the results of one job, more are sorted in temporary files")
+    parser.add_argument("--merge", action="store_true",
+                        help="one report from all workbooks, results repeated in several are written once")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    args = parser.parse_args(argv)
+
+    structures = load_structures(args.db, args.config)
+    jobs = build_jobs(args, structures)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    failed = 0
+    for summary in run_jobs(jobs, args.workers, args.merge):
+        print_summary(summary)
+        if summary['status'] != "ok":
+            failed += 1
+
+    print(f"{len(jobs)} jobs, {failed} failed, {time.perf_counter() - started:.2f}s total")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""Times and memory-profiles each stage of the LasarusResults pipeline.
+
+Stages: gather (gather_by_structure), sort, compose (write_report) and save
+(doc.save, or finishing the archive for the streaming engine). Results are
+written as JSON and can be compared with a baseline saved earlier.
+
+Timings only compare on the same machine, so no baseline is committed:
+save one locally from the revision to compare against, then run the
+benchmark again with the change, using the same --rows, --format and
+--engine for both runs:
+
+    python benchmarks/bench_pipeline.py --rows 1000 10000 --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_pipeline.py --rows 1000 10000 --baseline benchmarks/baseline.json
+
+benchmarks/baseline.json is ignored by git. Without --rows every size up
+to 500000 rows is run, which takes a while. Results missing from the
+baseline are listed and not compared. The .xls workbooks are generated
+with xlwt from requirements-dev.txt.
+
+The run exits with status 1 when a stage is slower (or uses more memory)
+than the baseline by more than the threshold. Memory is the tracemalloc
+peak of each stage, so it only covers Python allocations: lxml trees built
+by python-docx live in C memory and are not included.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lasarus import LasarusResults, ENGINES
+from generate import STRUCTURES, XLS_MAX_ROWS, workbook_path
+
+
+STAGES = ["gather", "sort", "compose", "save"]
+# Differences below these are treated as noise
+MIN_SECONDS_DELTA = 0.05
+MIN_BYTES_DELTA = 1024 * 1024
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def measure(self, stage):
+        started = time.perf_counter()
+        yield
+        self.stages[stage] = {"seconds": time.perf_counter() - started}
+
+
+class StageMemory:
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def measure(self, stage):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        yield
+        self.stages[stage] = {"peak_bytes": tracemalloc.get_traced_memory()[1] - current}
+
+
+def run_pipeline(file_name, structure, engine, meter):
+    with tempfile.TemporaryDirectory() as output_dir:
+        lasarus_results = LasarusResults(file_name)
+        with meter.measure("gather"):
+            results = lasarus_results.gather_by_structure("Data", structure)
+        with meter.measure("sort"):
+            results = results.sorted()
+        writer = ENGINES[engine](os.path.join(output_dir, "report" + ENGINES[engine].extension))
+        with meter.measure("compose"):
+            lasarus_results.write_report(writer, results)
+        with meter.measure("save"):
+            writer.close()
+    return meter.stages
+
+
+def run_benchmarks(args):
+    results = {}
+    for file_format in args.format:
+        for row_count in args.rows:
+            if file_format == "xls" and row_count > XLS_MAX_ROWS:
+                print(f"skip {file_format} {row_count}: over the format limit")
+                continue
+            file_name = workbook_path(args.data_dir, file_format, row_count)
+            structure = STRUCTURES[args.test]
+
+            timings = run_pipeline(file_name, structure, args.engine, StageTimer())
+            memory = {}
+            if not args.no_memory:
+                tracemalloc.start()
+                try:
+                    memory = run_pipeline(file_name, structure, args.engine, StageMemory())
+                finally:
+                    tracemalloc.stop()
+
+            for stage in STAGES:
+                key = f"{args.engine}-{file_format}-{row_count}-{stage}"
+                results[key] = dict(timings[stage], **memory.get(stage, {}))
+                peak = results[key].get("peak_bytes")
+                peak_text = f"{peak / 1024 / 1024:9.1f} MB" if peak is not None else ""
+                print(f"{key:<32} {results[key]['seconds']:9.3f} s {peak_text}", flush=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Returns the list of regressions against the baseline."""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        for metric, min_delta in (("seconds", MIN_SECONDS_DELTA), ("peak_bytes", MIN_BYTES_DELTA)):
+            if metric not in current or metric not in previous:
+                continue
+            delta = current[metric] - previous[metric]
+            if delta > min_delta and current[metric] > previous[metric] * (1 + threshold):
+                regressions.append(f"{key} {metric}: {previous[metric]:.3f} -> {current[metric]:.3f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the LasarusResults pipeline stages")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000, 500000])
+    parser.add_argument("--format", choices=["xlsx", "xls"], nargs="+", default=["xlsx", "xls"])
+    parser.add_argument("--engine", choices=list(ENGINES), default="docx")
+    parser.add_argument("--test", choices=list(STRUCTURES), default="Адаптивність 200")
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(__file__), "data"))
+    parser.add_argument("--output", default="bench_output.json", help="where the results are written as JSON")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--save-baseline", help="also store the results as a baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 means 25%%")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+    for file_name in filter(None, [args.output, args.save_baseline]):
+        with open(file_name, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        missing = [key for key in results if key not in baseline]
+        if missing:
+            print(f"Not in the baseline, not compared: {', '.join(missing)}")
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""Measures the application's startup and checks it against a budget.
+
+Every run starts a fresh interpreter with -X importtime, imports main and
+times how long it takes until the window is shown (on the offscreen Qt
+platform unless QT_QPA_PLATFORM is set). The fastest of --runs runs is
+kept, the slowest imports are listed:
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --import-budget 300 --window-budget 600
+
+The run exits with status 1 when a budget is exceeded or when one of the
+deferred modules (python-docx, openpyxl, xlrd, numpy...) is imported
+before the window appears: they must only be imported on first use.
+The frozen build adds unpacking time on top of this, which is not measured.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported on first use, never while the window starts
+DEFERRED_MODULES = ["lasarus", "docx", "lxml", "openpyxl", "xlrd", "numpy", "result_store", "sheet_preview"]
+
+STARTUP_SCRIPT = """
+import sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from PySide6.QtWidgets import QApplication
+app = QApplication(sys.argv)
+window = main.App()
+window.show()
+app.processEvents()
+shown = time.perf_counter()
+print(f"STARTUP {imported - started:.6f} {shown - started:.6f}")
+window.close()
+"""
+
+IMPORT_TIME_PATTERN = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def parse_import_times(stderr):
+    """{module: (self µs, cumulative µs)} from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, _, module = match.groups()
+            modules[module] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def run_startup(python):
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_DIR, env.get("PYTHONPATH")]))
+    # The app creates its database in the working directory
+    with tempfile.TemporaryDirectory() as work_dir:
+        completed = subprocess.run([python, "-X", "importtime", "-c", STARTUP_SCRIPT], cwd=work_dir, env=env,
+                                   capture_output=True, text=True, timeout=120)
+    if completed.returncode != 0:
+        raise RuntimeError(f"startup failed:\n{completed.stderr[-2000:]}")
+    timings = re.search(r"STARTUP (\S+) (\S+)", completed.stdout)
+    return float(timings.group(1)), float(timings.group(2)), parse_import_times(completed.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the application startup")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters started, the fastest is kept")
+    parser.add_argument("--import-budget", type=float, default=400, help="ms allowed for import main")
+    parser.add_argument("--window-budget", type=float, default=800, help="ms allowed until the window is shown")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports listed")
+    parser.add_argument("--python", default=sys.executable)
+    parser.add_argument("--output", help="where the results are written as JSON")
+    args = parser.parse_args(argv)
+
+    best = None
+    for _ in range(args.runs):
+        run = run_startup(args.python)
+        if best is None or run[1] < best[1]:
+            best = run
+    import_seconds, window_seconds, modules = best
+
+    print(f"import main   {import_seconds * 1000:8.1f} ms (budget {args.import_budget:.0f} ms)")
+    print(f"window shown  {window_seconds * 1000:8.1f} ms (budget {args.window_budget:.0f} ms)")
+    print("slowest imports (self time):")
+    for module, (self_us, cumulative_us) in sorted(modules.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"  {module:<48} {self_us / 1000:8.1f} ms, with imports {cumulative_us / 1000:8.1f} ms")
+
+    failures = []
+    if import_seconds * 1000 > args.import_budget:
+        failures.append(f"import main took {import_seconds * 1000:.0f} ms, over {args.import_budget:.0f} ms")
+    if window_seconds * 1000 > args.window_budget:
+        failures.append(f"window shown after {window_seconds * 1000:.0f} ms, over {args.window_budget:.0f} ms")
+    for module in DEFERRED_MODULES:
+        if module in modules:
+            failures.append(f"{module} is imported at startup")
+
+    if args.output:
+        report = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "date": datetime.now().isoformat(timespec="seconds"),
+            },
+            "import_seconds": import_seconds,
+            "window_seconds": window_seconds,
+            "imports": {module: {"self_us": self_us, "cumulative_us": cumulative_us}
+                        for module, (self_us, cumulative_us) in modules.items()},
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    if failures:
+        return 1
+    print("Startup within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
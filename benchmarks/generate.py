@@ -0,0 +1,118 @@
+"""Synthetic Lasarus-shaped workbooks for benchmarks.
+
+The layout follows the default TestStructures: date in A, names in B and C,
+data in BS, GD..GZ and HA..HO. .xls output needs xlwt (requirements-dev.txt)
+and is limited to 65535 data rows by the format.
+"""
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+from openpyxl.utils import column_index_from_string
+
+
+STRUCTURES = {
+    'Адаптивність 200': {'name_column': 'C', 'date_column': 'A', 'data_columns': 'HA,HC,HE,HG,HI,HK,HM,HO'},
+    'Соціоніка': {'name_column': 'B', 'date_column': 'A', 'data_columns': 'BS'},
+    'Акцентуація Особистості': {'name_column': 'B', 'date_column': 'A', 'data_columns': 'GD,GF,GH,GJ,GL,GN,GP,GR,GT,GV,GX,GZ'},
+}
+
+XLS_MAX_ROWS = 65535
+# Share of rows with a missing cell, so the error path is exercised too
+ERROR_RATE = 0.005
+
+
+def data_columns():
+    columns = set()
+    for structure in STRUCTURES.values():
+        for col in structure['data_columns'].split(','):
+            columns.add(column_index_from_string(col) - 1)
+    return sorted(columns)
+
+
+def generate_rows(row_count, seed=1):
+    """Yields rows as lists indexed by 0-based column, header first."""
+    rng = random.Random(seed)
+    columns = data_columns()
+    width = columns[-1] + 1
+    names = [f"Прізвище{i} Ім'я{i}" for i in range(500)]
+    start = datetime(2021, 1, 1, 8, 0)
+
+    header = [None] * width
+    header[0], header[1], header[2] = "Дата", "ПІБ", "ПІБ"
+    yield header
+
+    for row_idx in range(row_count):
+        row = [None] * width
+        row[0] = start + timedelta(minutes=rng.randrange(3 * 365 * 24 * 60))
+        name = rng.choice(names)
+        row[1] = name
+        row[2] = name
+        for col in columns:
+            row[col] = (f"Шкала {col}: {rng.randrange(100)} балів. Опис результату для рядка {row_idx} "
+                        f"з поясненням.|Другий абзац опису.")
+        if rng.random() < ERROR_RATE:
+            row[rng.choice(columns)] = None
+        yield row
+
+
+def write_xlsx(file_name, row_count):
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    sheet = wb.create_sheet("Data")
+    for row in generate_rows(row_count):
+        sheet.append(row)
+    wb.save(file_name)
+
+
+def write_xls(file_name, row_count):
+    import xlwt
+
+    if row_count > XLS_MAX_ROWS:
+        raise ValueError(f".xls holds at most {XLS_MAX_ROWS} data rows")
+    wb = xlwt.Workbook(encoding="utf-8")
+    sheet = wb.add_sheet("Data")
+    date_style = xlwt.easyxf(num_format_str="DD.MM.YYYY hh:mm:ss")
+    for row_idx, row in enumerate(generate_rows(row_count)):
+        for col, value in enumerate(row):
+            if value is None:
+                continue
+            if isinstance(value, datetime):
+                sheet.write(row_idx, col, value, date_style)
+            else:
+                sheet.write(row_idx, col, value)
+    wb.save(file_name)
+
+
+WRITERS = {"xlsx": write_xlsx, "xls": write_xls}
+
+
+def workbook_path(data_dir, file_format, row_count):
+    """Returns the path of a generated workbook, creating it on first use."""
+    os.makedirs(data_dir, exist_ok=True)
+    file_name = os.path.join(data_dir, f"lasarus_{row_count}.{file_format}")
+    if not os.path.exists(file_name):
+        WRITERS[file_format](file_name + ".part", row_count)
+        os.replace(file_name + ".part", file_name)
+    return file_name
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic Lasarus workbooks")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000, 500000])
+    parser.add_argument("--format", choices=list(WRITERS), nargs="+", default=list(WRITERS))
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(__file__), "data"))
+    args = parser.parse_args(argv)
+
+    for file_format in args.format:
+        for row_count in args.rows:
+            if file_format == "xls" and row_count > XLS_MAX_ROWS:
+                print(f"skip {row_count} rows .{file_format}: over the format limit")
+                continue
+            print(workbook_path(args.data_dir, file_format, row_count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+from report_template import (BODY_STYLE, DATE_STYLE, LEAD_STYLE, MONTH_STYLE, PERSON_STYLE,
+                             ensure_report_styles, has_report_styles, report_template)
+
+
+DOCUMENT_PART = "word/document.xml"
+# Written XML is flushed into the archive in chunks of about this size
+FLUSH_SIZE = 1024 * 1024
+
+# Characters that are not allowed in XML 1.0
+INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+LEAD_RUN_PROPERTIES = f'<w:rPr><w:rStyle w:val="{LEAD_STYLE}"/></w:rPr>'
+PAGE_BREAK = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+EMPTY_PARAGRAPH = '<w:p><w:r/></w:p>'
+TOC = (
+    '<w:p><w:r><w:fldChar w:fldCharType="begin"/>'
+    '<w:instrText xml:space="preserve">TOC \\o "1-3" \\h \\z \\u \\t "Lasarus Month,1,Lasarus Person,2"</w:instrText>'
+    '<w:fldChar w:fldCharType="separate"><w:t>Right-click to update field.</w:t></w:fldChar>'
+    '<w:fldChar w:fldCharType="end"/></w:r></w:p>'
+)
+
+
+def paragraph_xml(style_id, runs):
+    return f'<w:p><w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>{runs}</w:p>'
+
+
+def run_xml(text, properties=""):
+    """Same markup python-docx produces for add_run(text)."""
+    text = INVALID_XML_CHARS.sub("", text)
+    parts = []
+    for i, line in enumerate(text.split("\n")):
+        if i:
+            parts.append("<w:br/>")
+        for j, chunk in enumerate(line.split("\t")):
+            if j:
+                parts.append("<w:tab/>")
+            if chunk:
+                space = ' xml:space="preserve"' if chunk[0].isspace() or chunk[-1].isspace() else ""
+                parts.append(f"<w:t{space}>{escape(chunk)}</w:t>")
+    return f"<w:r>{properties}{''.join(parts)}</w:r>"
+
+
+class DocxBodyWriter:
+    """Collects the report's WordprocessingML body in memory.
+
+    Used to render parts of a report in other processes, the pieces are
+    then written in order into one StreamingDocxWriter.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.buffer_size = 0
+
+    def write(self, xml):
+        self.buffer.append(xml)
+        self.buffer_size += len(xml)
+
+    def getvalue(self):
+        return "".join(self.buffer)
+
+    def add_toc(self):
+        self.write(TOC)
+
+    def add_date_break(self, text):
+        self.write(paragraph_xml(MONTH_STYLE, run_xml(text)))
+
+    def add_new_block(self, text):
+        self.write(EMPTY_PARAGRAPH)
+        self.write(paragraph_xml(PERSON_STYLE, run_xml(text)))
+
+    def add_date_line(self, text):
+        self.write(paragraph_xml(DATE_STYLE, run_xml(text)))
+
+    def add_paragraph(self, text, bold_first_sentence):
+        first_sentence_end = text.find('.') + 1
+        if bold_first_sentence and first_sentence_end > 0:
+            runs = run_xml(text[:first_sentence_end], LEAD_RUN_PROPERTIES) + run_xml(text[first_sentence_end:])
+        else:
+            runs = run_xml(text)
+        self.write(paragraph_xml(BODY_STYLE, runs))
+
+    def add_child_block(self, text, bold_first_sentence=True):
+        paragraphs = text.split("|")
+        for i, paragraph in enumerate(paragraphs):
+            self.add_paragraph(paragraph, bold_first_sentence if i == 0 else False)
+
+    def add_page_break(self):
+        self.write(PAGE_BREAK)
+
+    def add_result(self, result):
+        self.add_new_block(str(result.name))
+        self.add_date_line(result.date.strftime('%d-%m-%Y %H:%M:%S'))
+        for part in result.info:
+            self.add_child_block(str(part))
+        self.add_page_break()
+
+
+class StreamingDocxWriter(DocxBodyWriter):
+    """Writes the report straight into word/document.xml of the .docx archive.
+
+    Every other part of the package (styles, settings, theme...) is copied
+    from the report template, so the result looks the same as the one built
+    by DocxWriter while memory stays bounded by FLUSH_SIZE. template may be
+    a python-docx Document or the path of a .docx, such as a report template
+    or a previous report to append to.
+    """
+
+    extension = ".docx"
+
+    def __init__(self, file_name, template=None):
+        if isinstance(template, str) and has_report_styles(template):
+            # Copied as is, its body may be too large to load
+            template_data = template
+        else:
+            if template is None or isinstance(template, str):
+                template = report_template(template)
+            else:
+                ensure_report_styles(template)
+            template_data = io.BytesIO()
+            template.save(template_data)
+
+        self.archive = zipfile.ZipFile(file_name, "w", zipfile.ZIP_DEFLATED)
+        try:
+            with zipfile.ZipFile(template_data) as template_archive:
+                for item in template_archive.infolist():
+                    if item.filename != DOCUMENT_PART:
+                        self.archive.writestr(item, template_archive.read(item.filename))
+                document_xml = template_archive.read(DOCUMENT_PART).decode("utf-8")
+
+            # Template content stays in front of the report, the final
+            # section properties go after it
+            body_end = document_xml.rindex("</w:body>")
+            section_start = document_xml.rfind("<w:sectPr", 0, body_end)
+            split_at = section_start if section_start != -1 else body_end
+            self.document_tail = document_xml[split_at:]
+
+            self.part = self.archive.open(DOCUMENT_PART, "w", force_zip64=True)
+        except Exception:
+            self.archive.close()
+            raise
+        super().__init__()
+        self.write(document_xml[:split_at])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, xml):
+        super().write(xml)
+        if self.buffer_size >= FLUSH_SIZE:
+            self.flush()
+
+    def flush(self):
+        self.part.write("".join(self.buffer).encode("utf-8"))
+        self.buffer = []
+        self.buffer_size = 0
+
+    def close(self):
+        self.write(self.document_tail)
+        self.flush()
+        self.part.close()
+        self.archive.close()
+
+    def abort(self):
+        self.part.close()
+        self.archive.close()
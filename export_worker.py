@@ -0,0 +1,211 @@
+import os
+import queue
+import threading
+from PySide6.QtCore import QObject, QThread, Signal
+from run_stats import report_file_name
+from workbook_cache import CachedWorkbook, workbook_cache
+
+
+class Job:
+    """Base of the jobs run by ExportWorker, writing documents to (key, output_file_name) outputs."""
+
+    def __init__(self, outputs, date_from=None, date_to=None, engine="docx"):
+        self.outputs = outputs
+        self.date_from = date_from
+        self.date_to = date_to
+        self.engine = engine
+        self.error_rows = []
+        # "json", "csv" or None to skip the run report
+        self.report_format = None
+        # .docx with the report styles, None for the default look
+        self.template = None
+        self.stats = None
+
+    def display_name(self):
+        return ", ".join(os.path.basename(output_file_name) for _, output_file_name in self.outputs)
+
+    def report_file_name(self):
+        # One report per job, next to its first document
+        if not self.report_format:
+            return None
+        return report_file_name(self.outputs[0][1], self.report_format)
+
+    def source(self):
+        # The LasarusResults source, None when no workbook is read in this process
+        return None
+
+    def run(self, lasarus_results):
+        raise NotImplementedError
+
+
+class ExportJob(Job):
+    def __init__(self, file_path, sheet_name, outputs, date_from=None, date_to=None, engine="docx"):
+        # outputs is [(structure, output_file_name)], all written from one sheet scan
+        super().__init__(outputs, date_from, date_to, engine)
+        self.file_path = file_path
+        self.sheet_name = sheet_name
+        # Incremental export: TestStructures ids, their watermarks (None for a
+        # full export) and whether new results are appended to the outputs
+        self.structure_ids = []
+        self.watermarks = None
+        self.append = False
+        # Sharded rendering: "month", "year" or None, split saves one document per period
+        self.shard_by = None
+        self.split = False
+        self.new_watermarks = []
+
+    def source(self):
+        return CachedWorkbook(self.file_path, workbook_cache)
+
+    def run(self, lasarus_results):
+        lasarus_results.save_results_by_structures(self.sheet_name, self.outputs, self.engine,
+                                                   self.watermarks, self.append, self.shard_by, self.split)
+        self.error_rows = lasarus_results.error_rows
+        self.new_watermarks = lasarus_results.watermarks
+
+
+class MergedExportJob(Job):
+    """Exports one report per test with the results of several workbooks, read in parallel."""
+
+    def __init__(self, file_paths, sheet_name, outputs, date_from=None, date_to=None, engine="docx"):
+        # outputs is [(structure, output_file_name)], every workbook is read in a worker process
+        super().__init__(outputs, date_from, date_to, engine)
+        self.file_paths = file_paths
+        # None reads the first sheet of every workbook
+        self.sheet_name = sheet_name
+
+    def run(self, lasarus_results):
+        sources = [(file_path, self.sheet_name) for file_path in self.file_paths]
+        lasarus_results.save_merged_results(sources, self.outputs, self.engine)
+        self.error_rows = lasarus_results.error_rows
+
+
+class ImportJob(Job):
+    """Imports gathered results of several tests into the ResultStore."""
+
+    def __init__(self, file_path, sheet_name, structures, db_path):
+        # Nothing is written to a document
+        super().__init__([])
+        self.file_path = file_path
+        self.sheet_name = sheet_name
+        # [(TestStructures id, structure)]
+        self.structures = structures
+        self.db_path = db_path
+        self.imported = 0
+
+    def display_name(self):
+        return os.path.basename(self.file_path)
+
+    def source(self):
+        return CachedWorkbook(self.file_path, workbook_cache)
+
+    def run(self, lasarus_results):
+        from external_sort import SpilledResults
+        from result_store import ResultStore
+        gathered = lasarus_results.gather_by_structures(self.sheet_name, [structure for _, structure in self.structures])
+        store = ResultStore(self.db_path)
+        try:
+            with lasarus_results.stats.stage("storing"):
+                for (test_id, _), results in zip(self.structures, gathered):
+                    self.imported += store.import_results(test_id, results, self.file_path, self.sheet_name,
+                                                          lasarus_results.report_progress)
+        finally:
+            store.close()
+            for results in gathered:
+                if isinstance(results, SpilledResults):
+                    results.close()
+        self.error_rows = lasarus_results.error_rows
+
+
+class StoreExportJob(Job):
+    """Exports results imported into the ResultStore, no workbook is read."""
+
+    def __init__(self, outputs, db_path, date_from=None, date_to=None, engine="docx"):
+        # outputs is [(TestStructures id, output_file_name)]
+        super().__init__(outputs, date_from, date_to, engine)
+        self.db_path = db_path
+
+    def run(self, lasarus_results):
+        from result_store import ResultStore
+        store = ResultStore(self.db_path)
+        try:
+            for test_id, output_file_name in self.outputs:
+                lasarus_results.save_stored_results(store, test_id, output_file_name, self.engine)
+        finally:
+            store.close()
+
+
+class ExportWorker(QObject):
+    """Runs queued exports one by one outside of the GUI thread."""
+
+    # stage ("reading", "storing", "composing", "writing"), rows done, rows total (0 if unknown)
+    progress = Signal(str, int, int)
+    job_started = Signal(object)
+    job_finished = Signal(object)
+    job_failed = Signal(object, str)
+    job_cancelled = Signal(object)
+    queue_changed = Signal(int)
+
+    def __init__(self):
+        super().__init__()
+        self.jobs = queue.Queue()
+        self.cancel_event = threading.Event()
+
+        self.thread = QThread()
+        self.moveToThread(self.thread)
+        self.thread.started.connect(self.run)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        # Cancel the current job, drop the pending ones and let the loop exit
+        self.cancel_all()
+        self.jobs.put(None)
+        self.thread.quit()
+        self.thread.wait()
+
+    def add_job(self, job):
+        self.jobs.put(job)
+        self.queue_changed.emit(self.jobs.qsize())
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def cancel_all(self):
+        while True:
+            try:
+                self.jobs.get_nowait()
+            except queue.Empty:
+                break
+        self.queue_changed.emit(0)
+        self.cancel()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            # lasarus brings python-docx, lxml and numpy, it is imported with
+            # the first job so it does not compete with the window at startup
+            from lasarus import LasarusResults, ExportCancelled
+            self.queue_changed.emit(self.jobs.qsize())
+            self.cancel_event.clear()
+            self.job_started.emit(job)
+
+            try:
+                lasarus_results = LasarusResults(job.source(), job.date_from, job.date_to)
+                lasarus_results.progress_callback = self.progress.emit
+                lasarus_results.cancel_check = self.cancel_event.is_set
+                lasarus_results.template = job.template
+                job.stats = lasarus_results.stats
+                job.run(lasarus_results)
+                report_file_name = job.report_file_name()
+                if report_file_name:
+                    job.stats.write(report_file_name)
+            except ExportCancelled:
+                self.job_cancelled.emit(job)
+            except Exception as e:
+                self.job_failed.emit(job, str(e))
+            else:
+                self.job_finished.emit(job)
@@ -0,0 +1,159 @@
+"""Sorting more results than fit in memory.
+
+SpillingTableBuilder collects results like ResultTableBuilder. Once the
+collected results take more than max_bytes they are sorted and written to a temporary file as a run. The runs are read back chunk by
+chunk and merged with heapq.merge while the report is written, so memory
+stays bounded by the threshold plus one chunk per run.
+"""
+import heapq
+import os
+import pickle
+import tempfile
+from itertools import islice
+from result_table import ResultTable, ResultTableBuilder, SingleResult, name_sort_key
+
+
+# Results pickled together in a run file, and read back at once
+RUN_CHUNK = 10000
+# How often (in appended results) the memory taken by a builder is estimated
+SPILL_CHECK_STEP = 10000
+
+
+def result_key(result):
+    # Same order as ResultTable.sorted()
+    return result.date, name_sort_key(result.name)
+
+
+def table_chunks(results):
+    """Splits a ResultTable, or any iterable of SingleResult, into tables of RUN_CHUNK results."""
+    if isinstance(results, ResultTable):
+        for start in range(0, len(results), RUN_CHUNK):
+            yield results.take(slice(start, start + RUN_CHUNK))
+        return
+    results = iter(results)
+    while True:
+        batch = list(islice(results, RUN_CHUNK))
+        if not batch:
+            return
+        yield ResultTable.from_results(batch)
+
+
+def write_run(results, file_name):
+    """Writes sorted results (a ResultTable or SpilledResults) as pickled column chunks."""
+    with open(file_name, "wb") as f:
+        for chunk in table_chunks(results):
+            # Names repeat within a chunk, pickle stores every name object once
+            pickle.dump((chunk.dates, chunk.name_list(), chunk.info), f, pickle.HIGHEST_PROTOCOL)
+
+
+def read_run(file_name):
+    """Yields the SingleResult objects of a run file in order, one chunk in memory."""
+    names = {}
+    with open(file_name, "rb") as f:
+        while True:
+            try:
+                dates, chunk_names, info = pickle.load(f)
+            except EOFError:
+                return
+            dates = dates.astype("datetime64[us]").tolist()
+            info = [column.tolist() for column in info]
+            for i, date in enumerate(dates):
+                # Equal names of different chunks share one string
+                name = names.setdefault(chunk_names[i], chunk_names[i])
+                yield SingleResult(name=name, date=date, info=[column[i] for column in info])
+
+
+class SpilledResults:
+    """Sorted results of one structure kept as sorted runs on disk.
+
+    Iterating merges the runs (and the last run, still in memory) into
+    SingleResult objects ordered by (date, name). Stands in for a sorted
+    ResultTable where results are only streamed: writing a report or
+    importing into a ResultStore.
+    """
+
+    def __init__(self, run_files, table, names, length, last_date, directory):
+        self.run_files = run_files
+        # The results collected after the last spill, sorted
+        self.table = table
+        self.names = names
+        self.length = length
+        self.last = last_date
+        # tempfile.TemporaryDirectory, removed with this object or by close()
+        self.directory = directory
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        runs = [read_run(file_name) for file_name in self.run_files]
+        return heapq.merge(*runs, iter(self.table), key=result_key)
+
+    def sorted(self):
+        return self
+
+    def last_date(self):
+        return self.last
+
+    def close(self):
+        self.directory.cleanup()
+
+
+class SpillingTableBuilder:
+    """ResultTableBuilder that spills sorted runs to temporary files above max_bytes.
+
+    build() returns a ResultTable (not sorted yet) when nothing had to be
+    spilled, otherwise SpilledResults.
+    """
+
+    def __init__(self, data_column_count, max_bytes=None, directory=None):
+        self.data_column_count = data_column_count
+        self.max_bytes = max_bytes
+        # Where the temporary directory with the runs is created, None for the system default
+        self.directory = directory
+        self.builder = ResultTableBuilder(data_column_count)
+        self.appended = 0
+        self.temp_dir = None
+        self.run_files = []
+        self.run_length = 0
+        self.last_date = None
+        self.names = set()
+
+    def append(self, result):
+        self.builder.append(result)
+        self.appended += 1
+        if (self.max_bytes and self.appended % SPILL_CHECK_STEP == 0
+                and self.builder.estimated_bytes() > self.max_bytes):
+            self.spill()
+
+    def collected_table(self):
+        table = self.builder.build()
+        self.builder = ResultTableBuilder(self.data_column_count)
+        return table
+
+    def add_run_info(self, table):
+        self.run_length += len(table)
+        self.names.update(table.names)
+        last_date = table.last_date()
+        if last_date and (self.last_date is None or last_date > self.last_date):
+            self.last_date = last_date
+
+    def spill(self):
+        table = self.collected_table().sorted()
+        if not len(table):
+            return
+        if self.temp_dir is None:
+            self.temp_dir = tempfile.TemporaryDirectory(prefix="lasarus-", dir=self.directory)
+        file_name = os.path.join(self.temp_dir.name, f"run{len(self.run_files):04d}.pickle")
+        write_run(table, file_name)
+        self.run_files.append(file_name)
+        self.add_run_info(table)
+
+    def build(self):
+        table = self.collected_table()
+        if not self.run_files:
+            return table
+        table = table.sorted()
+        self.add_run_info(table)
+        return SpilledResults(self.run_files, table, sorted(self.names, key=name_sort_key), self.run_length,
+                              self.last_date, self.temp_dir)
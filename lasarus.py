@@ -1,129 +1,131 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
 from datetime import datetime
-from docx import Document
-from docx.shared import Pt, RGBColor
+from itertools import groupby
+import multiprocessing
+import os
+import tempfile
+import time
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
-import openpyxl
-from typing import List
+from readers import data_row_count, open_reader, parse_text_date
+from docx_stream import DocxBodyWriter, StreamingDocxWriter
+from plain_writers import PLAIN_ENGINES, CsvReportWriter, HtmlReportWriter, JsonLinesWriter
+from report_template import BODY_STYLE, DATE_STYLE, LEAD_STYLE, MONTH_STYLE, PERSON_STYLE, report_template
+from watermarks import RowFingerprint, structure_columns
+from run_stats import RowError, RunStats
+from result_table import ResultTable, SingleResult, month_title, name_sort_key
+from external_sort import SpilledResults, SpillingTableBuilder, write_run
 
 
-uk_months = ["Січень", "Лютий", "Березень",
-     "Квітень",  "Травень",  "Червень",
-     "Липень",  "Серпень", "Вересень",
-     "Жовтень","Листопад","Грудень"]
+# How many sheet rows are read between two progress/cancellation checks
+PROGRESS_STEP = 500
+# Minimal delay in seconds between two progress reports of the same stage
+PROGRESS_INTERVAL = 0.1
+# Results passed at once to writers with add_table()
+TABLE_CHUNK = 5000
+# Memory for the results gathered from one sheet scan, more is sorted on disk
+DEFAULT_MAX_MEMORY = 1024 * 1024 * 1024
 
 
-class SingleResult:
-    def __init__(self, name: str, date: datetime, info: List[str]):
-        self.name = name
-        self.date = date
-        self.info = info
+class ExportCancelled(Exception):
+    pass
 
 
-class LasarusResults:
-    def __init__(self, file_name: str, date_from: datetime = None, date_to: datetime = None):
+class DocxWriter:
+    """Builds the report as a python-docx document in memory."""
+
+    extension = ".docx"
+
+    def __init__(self, file_name=None, template=None):
         self.file_name = file_name
-        self.error_rows = []
-        self.use_date_filter = False
-        self.date_from = date_from
-        self.date_to = date_to
+        # template may be a report template or a previous report to append to
+        self.doc = report_template(template)
+        self.body = self.doc.element.body
+        self.body_end = self.body.sectPr
 
-        # Enable date filtering if a valid date range is provided
-        if self.date_from and self.date_to:
-            self.use_date_filter = True
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def close(self):
+        if self.file_name:
+            self.doc.save(self.file_name)
+
+    def abort(self):
+        # Nothing is written before close()
+        pass
+
+    def new_paragraph(self, style_id=None):
+        # Document.add_paragraph() looks for the body's sectPr among all the
+        # paragraphs every time, which makes long reports quadratic
+        paragraph = OxmlElement('w:p')
+        if style_id:
+            paragraph.style = style_id
+        if self.body_end is not None:
+            self.body_end.addprevious(paragraph)
+        else:
+            self.body.append(paragraph)
+        return paragraph
 
+    def add_run(self, paragraph, text, style_id=None):
+        run = paragraph.add_r()
+        if style_id:
+            run.style = style_id
+        run.text = text
+        return run
 
-    def create_date_break(self, doc, text):
-        paragraph = doc.add_paragraph()
-        paragraph.style = doc.styles['Heading 1']
-        run = paragraph.add_run(text)
-        run.font.size = Pt(16)
-        run.font.name = "Calibri Light"
-        run.font.color.rgb = RGBColor(47, 84, 150)
-        paragraph.paragraph_format.space_before = Pt(12)
-        paragraph.paragraph_format.space_after = Pt(6)
-
-    def create_new_block(self, doc, text):
-        doc.add_paragraph().add_run()
-        paragraph = doc.add_paragraph()
-        paragraph.style = doc.styles['Heading 2']
-        run = paragraph.add_run(text)
-        run.font.size = Pt(16)
-        run.font.name = "Calibri Light"
-        run.font.color.rgb = RGBColor(47, 84, 150)
-        paragraph.paragraph_format.space_before = Pt(6)
-        paragraph.paragraph_format.space_after = Pt(0)
-
-    def create_paragraph(self, doc, text, bold_first_sentence):
-        paragraph = doc.add_paragraph()
+    def add_date_break(self, text):
+        self.add_run(self.new_paragraph(MONTH_STYLE), text)
+
+    def add_new_block(self, text):
+        self.new_paragraph().add_r()
+        self.add_run(self.new_paragraph(PERSON_STYLE), text)
+
+    def add_date_line(self, text):
+        self.add_run(self.new_paragraph(DATE_STYLE), text)
+
+    def add_paragraph(self, text, bold_first_sentence):
+        paragraph = self.new_paragraph(BODY_STYLE)
         first_sentence_end = text.find('.') + 1
         if bold_first_sentence and first_sentence_end > 0:
-            paragraph.add_run(text[:first_sentence_end]).bold = True
-            paragraph.add_run(text[first_sentence_end:])
+            self.add_run(paragraph, text[:first_sentence_end], LEAD_STYLE)
+            self.add_run(paragraph, text[first_sentence_end:])
         else:
-            paragraph.add_run(text)
-        paragraph.paragraph_format.first_line_indent = Pt(12)
-        paragraph.paragraph_format.space_before = Pt(0)
-        paragraph.paragraph_format.space_after = Pt(0)
+            self.add_run(paragraph, text)
 
-    def add_child_block(self, doc, text, bold_first_sentence=True):
+    def add_child_block(self, text, bold_first_sentence=True):
         paragraphs = text.split("|")
         for i, paragraph in enumerate(paragraphs):
-            self.create_paragraph(doc, paragraph, bold_first_sentence if i == 0 else False)
-
-    def cell_by_name(self, name):
-        result = 0
-        for char in name.strip().upper():
-            result = result * 26 + (ord(char) - ord('A') + 1)
-        return result - 1
-
-    def gather_by_structure(self, sheet_name, structure):
-        wb = openpyxl.load_workbook(self.file_name)
-        sheet = wb[sheet_name]
-        results = []
-        for row_idx in range(2, sheet.max_row + 1):
-            try:
-                date_cell = sheet.cell(row=row_idx, column=self.cell_by_name(structure['date_column']) + 1).value
-                if not isinstance(date_cell, datetime) or date_cell < datetime(1900, 1, 1):
-                    raise ValueError(f"Invalid or missing date at row {row_idx}")
+            self.add_paragraph(paragraph, bold_first_sentence if i == 0 else False)
 
-                # Only apply date filtering if the date range is provided
-                if self.use_date_filter:
-                    if self.date_from and date_cell < self.date_from:
-                        continue
-                    if self.date_to and date_cell > self.date_to:
-                        continue
+    def add_page_break(self):
+        self.new_paragraph().add_r().add_br().type = "page"
 
-                name = sheet.cell(row=row_idx, column=self.cell_by_name(structure['name_column']) + 1).value
-                if not name:
-                    raise ValueError(f"Missing name at row {row_idx}")
-
-                info = []
-                for col in structure['data_columns'].split(','):
-                    cell_value = sheet.cell(row=row_idx, column=self.cell_by_name(col) + 1).value
-                    if cell_value is None:
-                        raise ValueError(f"Missing data in column {col} at row {row_idx}")
-                    info.append(cell_value)
-                results.append(SingleResult(name=name, date=date_cell, info=info))
-            
-            except Exception as e:
-                print(f"Error at row {row_idx}: {e}")
-                self.error_rows.append(row_idx)
-        
-        return results
+    def add_result(self, result):
+        self.add_new_block(str(result.name))
+        # Date in DD-MM-YYYY format
+        self.add_date_line(result.date.strftime('%d-%m-%Y %H:%M:%S'))
+        for part in result.info:
+            self.add_child_block(str(part))
+        self.add_page_break()
 
-    @staticmethod
-    def add_toc(doc):
+    def add_toc(self):
         """Adds a Table of Contents (TOC) to the document."""
-        paragraph = doc.add_paragraph()
-        run = paragraph.add_run()
+        r_element = self.new_paragraph().add_r()
 
         fldChar = OxmlElement('w:fldChar')
         fldChar.set(qn('w:fldCharType'), 'begin')
 
         instrText = OxmlElement('w:instrText')
         instrText.set(qn('xml:space'), 'preserve')
-        instrText.text = 'TOC \\o "1-3" \\h \\z \\u'  # Specify heading levels and options
+        # Heading levels, options and the report's heading styles
+        instrText.text = 'TOC \\o "1-3" \\h \\z \\u \\t "Lasarus Month,1,Lasarus Person,2"'
 
         fldChar2 = OxmlElement('w:fldChar')
         fldChar2.set(qn('w:fldCharType'), 'separate')
@@ -136,49 +138,585 @@ class LasarusResults:
         fldChar4 = OxmlElement('w:fldChar')
         fldChar4.set(qn('w:fldCharType'), 'end')
 
-        r_element = run._r
         r_element.append(fldChar)
         r_element.append(instrText)
         r_element.append(fldChar2)
         r_element.append(fldChar4)
 
-    def compose_doc_by_structure(self, sheet_name, structure):
-        doc = Document()
-        results = sorted(self.gather_by_structure(sheet_name, structure), key=lambda x: (x.date, x.name))
-        self.add_toc(doc)
-
-        if results:
-            month_index = int(results[0].date.strftime('%m')) - 1 
-            curr_month = f"{uk_months[month_index]} {results[0].date.strftime('%Y')}"
-
-            self.create_date_break(doc, curr_month)
-            doc.add_page_break()
-            
-            for result in results:
-                next_month_index = int(result.date.strftime('%m')) - 1 
-                next_month = f"{uk_months[next_month_index]} {results[0].date.strftime('%Y')}"
-                if next_month != curr_month:
-                    self.create_date_break(doc, next_month)
-                    curr_month = next_month
-
-                self.create_new_block(doc, result.name)
-                # Format date as DD-MM-YYYY
-                self.add_child_block(doc, result.date.strftime('%d-%m-%Y %H:%M:%S'), False)  # Date in DD-MM-YYYY format
-                for part in result.info:
-                    self.add_child_block(doc, part)
-               
-                doc.add_page_break()
-                
-        return doc
-
-    def save_results(self, sheet_name, output_file_name, structure):
+
+# Output engines selectable in save_results
+ENGINES = {
+    "docx": DocxWriter,
+    "stream": StreamingDocxWriter,
+    "csv": CsvReportWriter,
+    "jsonl": JsonLinesWriter,
+    "html": HtmlReportWriter,
+}
+
+
+def engine_for_file(output_file_name, engine="docx"):
+    """Engine writing output_file_name: plain formats follow the extension, .docx files use engine."""
+    extension = os.path.splitext(output_file_name)[1].lower()
+    return PLAIN_ENGINES.get(extension, engine)
+
+
+def split_into_shards(table, shard_by):
+    """Splits a sorted ResultTable into [(period, table)].
+
+    shard_by is "month", "year" or a number of results per shard.
+    """
+    if isinstance(shard_by, int):
+        return [(f"{start // shard_by + 1:03d}", table.take(slice(start, start + shard_by)))
+                for start in range(0, len(table), shard_by)]
+    if shard_by == "month":
+        bounds, label = table.group_bounds("M"), "%Y-%m"
+    elif shard_by == "year":
+        bounds, label = table.group_bounds("Y"), "%Y"
+    else:
+        raise ValueError(f"Unknown shard mode: {shard_by}")
+    shards = [table.take(slice(start, stop)) for start, stop in bounds]
+    return [(shard.dates[0].astype("datetime64[us]").item().strftime(label), shard) for shard in shards]
+
+
+def safe_file_name(file_name):
+    """file_name with the characters Windows does not allow in file names replaced by "_"."""
+    for char in '<>:"/\\|?*':
+        file_name = file_name.replace(char, "_")
+    return file_name
+
+
+def unique_file_name(file_name, used):
+    """file_name, with " (2)", " (3)"... added when it is in used, and adds it to used.
+
+    Workbooks with the same stem, such as jan/results.xlsx and feb/results.xlsx
+    or a.xlsx and a.xls, or tests named "A/B" and "A_B" would otherwise be
+    exported into the same file.
+    """
+    stem, extension = os.path.splitext(file_name)
+    candidate = file_name
+    number = 1
+    while os.path.normcase(os.path.abspath(candidate)) in used:
+        number += 1
+        candidate = f"{stem} ({number}){extension}"
+    used.add(os.path.normcase(os.path.abspath(candidate)))
+    return candidate
+
+
+def shard_file_name(output_file_name, period):
+    stem, ext = os.path.splitext(output_file_name)
+    return f"{stem} - {period}{ext}"
+
+
+# Both run in worker processes of save_sharded_report
+def render_shard(results, continue_from):
+    writer = DocxBodyWriter()
+    LasarusResults(None).write_report(writer, results, continue_from)
+    return writer.getvalue()
+
+
+def save_shard(results, output_file_name, engine, template):
+    LasarusResults(None).save_report(results, output_file_name, engine, template=template)
+    return output_file_name
+
+
+# Runs in worker processes of save_merged_results
+def gather_source(file_name, sheet_name, structures, date_from, date_to, max_memory, run_dirs):
+    """Gathers one workbook and writes every structure's sorted results as a run file.
+
+    Returns ([(run file, result count, last date, names)] per structure,
+    the RunStats and the error rows of the workbook.
+    """
+    lasarus_results = LasarusResults(file_name, date_from, date_to)
+    lasarus_results.max_memory = max_memory
+    lasarus_results.spill_dir = run_dirs[0]
+    if sheet_name is None:
+        sheet_name = lasarus_results.source.sheet_names()[0]
+    gathered = lasarus_results.gather_by_structures(sheet_name, structures)
+    runs = []
+    for results, run_dir in zip(gathered, run_dirs):
+        with lasarus_results.stats.stage("sorting"):
+            results = results.sorted()
+        handle, run_file = tempfile.mkstemp(suffix=".pickle", dir=run_dir)
+        os.close(handle)
+        write_run(results, run_file)
+        runs.append((run_file, len(results), results.last_date(), list(results.names)))
+        if isinstance(results, SpilledResults):
+            results.close()
+    return runs, lasarus_results.stats, lasarus_results.error_rows
+
+
+class LasarusResults:
+    def __init__(self, source, date_from: datetime = None, date_to: datetime = None):
+        # source is either a file name or an already opened source with
+        # iter_rows(sheet_name, first_col, last_col) and row_count(sheet_name),
+        # None when results come from a ResultStore
+        if isinstance(source, str):
+            self.file_name = source
+            source = open_reader(source)
+        else:
+            self.file_name = getattr(source, 'file_path', None)
+        self.source = source
+        # .docx with the report styles, None for the default look
+        self.template = None
+        # Gathered results above max_memory bytes are spilled as sorted runs
+        # into a temporary directory in spill_dir (None for the system default)
+        self.max_memory = DEFAULT_MAX_MEMORY
+        self.spill_dir = None
+        self.error_rows = []
+        # Timings, row counters and error records of everything this object runs
+        self.stats = RunStats()
+        self.use_date_filter = False
+        self.date_from = date_from
+        self.date_to = date_to
+
+        # Optional hooks used by background exports:
+        # progress_callback(stage, done, total) and cancel_check() -> bool
+        self.progress_callback = None
+        self.cancel_check = None
+        self.last_progress = (None, 0)
+
+        # Enable date filtering if a valid date range is provided
+        if self.date_from and self.date_to:
+            self.use_date_filter = True
+
+
+    def report_progress(self, stage, done, total=0):
+        if self.cancel_check and self.cancel_check():
+            raise ExportCancelled()
+        if self.progress_callback:
+            last_stage, last_time = self.last_progress
+            now = time.monotonic()
+            if stage != last_stage or done == total or now - last_time >= PROGRESS_INTERVAL:
+                self.last_progress = (stage, now)
+                self.progress_callback(stage, done, total)
+
+    def cell_by_name(self, name):
+        result = 0
+        for char in name.strip().upper():
+            result = result * 26 + (ord(char) - ord('A') + 1)
+        return result - 1
+
+    def column_layout(self, structure):
+        date_index = self.cell_by_name(structure['date_column'])
+        name_index = self.cell_by_name(structure['name_column'])
+        data_columns = structure['data_columns'].split(',')
+        data_indexes = [self.cell_by_name(col) for col in data_columns]
+        return date_index, name_index, data_columns, data_indexes
+
+    def parse_row(self, row_idx, row, date_pos, name_pos, data_columns, data_pos, date_column=None, name_column=None):
+        """Returns the SingleResult of a row, None if it is filtered out by date.
+
+        Raises RowError for rows that cannot be parsed.
+        """
+        date_cell = row[date_pos]
+        if isinstance(date_cell, str):
+            # Text sources keep dates as strings
+            date_cell = parse_text_date(date_cell.strip())
+        if not isinstance(date_cell, datetime) or date_cell < datetime(1900, 1, 1):
+            raise RowError(row_idx, date_column, "invalid_date", f"Invalid or missing date at row {row_idx}")
+
+        # Only apply date filtering if the date range is provided
+        if self.use_date_filter:
+            if self.date_from and date_cell < self.date_from:
+                return None
+            if self.date_to and date_cell > self.date_to:
+                return None
+
+        name = row[name_pos]
+        if not name:
+            raise RowError(row_idx, name_column, "missing_name", f"Missing name at row {row_idx}")
+
+        info = []
+        for col, pos in zip(data_columns, data_pos):
+            cell_value = row[pos]
+            if cell_value is None:
+                raise RowError(row_idx, col, "missing_data", f"Missing data in column {col} at row {row_idx}")
+            info.append(cell_value)
+        return SingleResult(name=name, date=date_cell, info=info)
+
+    def gather_by_structure(self, sheet_name, structure):
+        return self.gather_by_structures(sheet_name, [structure])[0]
+
+    def gather_by_structures(self, sheet_name, structures, watermarks=None):
+        """Collects results of several structures in one pass over the sheet.
+
+        Returns one ResultTable per structure, in the same order, filtered by
+        the date range. Results over self.max_memory are sorted on disk, the
+        structure then gets SpilledResults instead, already sorted. With
+        watermarks only rows after each watermark's last row are parsed, the
+        fingerprints of the scan are kept in self.fingerprints and the rows
+        filtered out by date of each structure in self.filtered_counts.
+        """
+        # Resolve the structures' columns once and read only the column window
+        # that covers them, streaming rows from the source.
+        layouts = [self.column_layout(structure) for structure in structures]
+        used_indexes = [index for date_index, name_index, _, data_indexes in layouts
+                        for index in [date_index, name_index] + data_indexes]
+        first_col = min(used_indexes)
+        last_col = max(used_indexes)
+        parsers = [(date_index - first_col, name_index - first_col, data_columns,
+                    [index - first_col for index in data_indexes],
+                    structure['date_column'], structure['name_column'])
+                   for (date_index, name_index, data_columns, data_indexes), structure in zip(layouts, structures)]
+        watermarks = watermarks or [None] * len(structures)
+        self.filtered_counts = [0] * len(structures)
+        self.fingerprints = [RowFingerprint([date_pos, name_pos] + data_pos, watermark)
+                             for (date_pos, name_pos, _, data_pos, _, _), watermark in zip(parsers, watermarks)]
+
+        stats = self.stats
+        total_rows = data_row_count(self.source.row_count(sheet_name)) or 0
+        max_bytes = self.max_memory // len(structures) if self.max_memory else None
+        builders = [SpillingTableBuilder(len(data_columns), max_bytes, directory=self.spill_dir)
+                    for _, _, data_columns, _ in layouts]
+        with stats.stage("reading"):
+            rows = self.source.iter_rows(sheet_name, first_col, last_col)
+            for row_idx, row in enumerate(rows, start=2):
+                if row_idx % PROGRESS_STEP == 0:
+                    self.report_progress("reading", row_idx - 1, total_rows)
+                stats.rows_scanned += 1
+                row_failed = False
+                for i, (parser, fingerprint, builder) in enumerate(zip(parsers, self.fingerprints, builders)):
+                    if not fingerprint.is_new(row_idx):
+                        fingerprint.add(row_idx, row)
+                        continue
+                    failed = True
+                    try:
+                        result = self.parse_row(row_idx, row, *parser)
+                    except RowError as e:
+                        stats.add_error(e.row, e.column, e.reason, str(e))
+                    except Exception as e:
+                        stats.add_error(row_idx, None, "unexpected", str(e))
+                    else:
+                        failed = False
+                        if result is None:
+                            self.filtered_counts[i] += 1
+                        else:
+                            builder.append(result)
+                    # Failed rows stay out of the watermark and are parsed again next time
+                    fingerprint.add(row_idx, row, failed)
+                    row_failed = row_failed or failed
+                if row_failed:
+                    self.error_rows.append(row_idx)
+            tables = [builder.build() for builder in builders]
+            self.report_progress("reading", total_rows, total_rows)
+        stats.drop_duplicate_errors()
+        stats.rows_filtered += sum(self.filtered_counts)
+        stats.rows_kept += sum(len(table) for table in tables)
+        stats.spilled_runs += sum(len(builder.run_files) for builder in builders)
+        return tables
+
+    def write_report(self, writer, results, continue_from=None, total=None):
+        """Writes sorted results to a writer, grouped by month.
+
+        results is a sorted ResultTable or any iterable of SingleResult, total
+        is then its length if known. continue_from is the last date of a
+        previous report the results are appended to, its month heading is not
+        repeated.
+        """
+        if total is None:
+            total = len(results)
+        if continue_from:
+            curr_month = month_title(continue_from)
+        else:
+            curr_month = None
+            writer.add_toc()
+
+        if isinstance(results, ResultTable):
+            months = results.iter_months()
+        else:
+            months = groupby(results, key=lambda result: month_title(result.date))
+
+        done = 0
+        for next_month, month_results in months:
+            if curr_month is None:
+                writer.add_date_break(next_month)
+                writer.add_page_break()
+            elif next_month != curr_month:
+                writer.add_date_break(next_month)
+            curr_month = next_month
+
+            # Plain writers take a month of a ResultTable in slices, whole
+            # columns at once instead of result by result
+            if isinstance(month_results, ResultTable) and hasattr(writer, "add_table"):
+                for start in range(0, len(month_results), TABLE_CHUNK):
+                    self.report_progress("composing", done, total)
+                    part = month_results.take(slice(start, start + TABLE_CHUNK))
+                    writer.add_table(next_month, part)
+                    done += len(part)
+                continue
+
+            for result in month_results:
+                self.report_progress("composing", done, total)
+                done += 1
+                writer.add_result(result)
+        # total may include results dropped while writing, such as duplicates
+        self.report_progress("composing", done, done)
+
+    def save_report(self, results, output_file_name, engine="docx", continue_from=None, template=None, total=None):
+        # Write into a temporary file first so a cancelled or failed export
+        # never leaves a half-written .docx behind.
+        partial_file_name = output_file_name + ".part"
+        engine = engine_for_file(output_file_name, engine)
         try:
-            doc = self.compose_doc_by_structure(sheet_name, structure)
-            doc.save(output_file_name)
-            if not self.error_rows:
-                print("Saved successfully!")
+            writer = ENGINES[engine](partial_file_name, template=template or self.template)
+            try:
+                with self.stats.stage("composing"):
+                    self.write_report(writer, results, continue_from, total)
+                self.report_progress("writing", 0)
+            except BaseException:
+                writer.abort()
+                raise
+            with self.stats.stage("writing"):
+                writer.close()
+            self.report_progress("writing", 1, 1)
+            os.replace(partial_file_name, output_file_name)
+        except BaseException:
+            self.remove_file(partial_file_name)
+            raise
+
+    def run_shards(self, tasks, workers=None, stage="composing"):
+        """Runs (function, *args) tasks in a process pool, returns their results in order."""
+        return list(self.iter_shards(tasks, workers, stage))
+
+    def iter_shards(self, tasks, workers=None, stage="composing"):
+        """Runs (function, *args) tasks in a process pool, yields each result as soon as it is next in order.
+
+        At most two tasks per worker are queued ahead of the next result, so
+        few finished results wait for an earlier one.
+        """
+        if workers == 1 or len(tasks) <= 1:
+            for done, (function, *args) in enumerate(tasks):
+                self.report_progress(stage, done, len(tasks))
+                yield function(*args)
+            return
+
+        workers = workers or os.cpu_count() or 1
+        # spawn: forking a process that runs Qt threads is not safe
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            queued = deque()
+            submitted = 0
+            try:
+                for done in range(len(tasks)):
+                    while submitted < len(tasks) and len(queued) < 2 * workers:
+                        function, *args = tasks[submitted]
+                        queued.append(executor.submit(function, *args))
+                        submitted += 1
+                    while not queued[0].done():
+                        wait([queued[0]], timeout=PROGRESS_INTERVAL)
+                        self.report_progress(stage, done, len(tasks))
+                    result = queued.popleft().result()
+                    self.report_progress(stage, done + 1, len(tasks))
+                    yield result
+            except BaseException:
+                # Shards already running are finished, queued ones are dropped
+                executor.shutdown(cancel_futures=True)
+                raise
+
+    def save_sharded_report(self, results, output_file_name, shard_by="month", split=False, engine="docx",
+                            workers=None):
+        """Renders a sorted ResultTable split into shards, each one in a worker process.
+
+        With split every shard is saved as its own document named after its
+        period, otherwise the rendered shard bodies are appended in order to
+        output_file_name behind a single TOC as soon as they are ready.
+        Joined shards are always written by StreamingDocxWriter, which
+        produces the same XML as DocxWriter. Returns the names of the
+        written files.
+        """
+        shards = split_into_shards(results, shard_by)
+        if split:
+            tasks = [(save_shard, shard, shard_file_name(output_file_name, period), engine, self.template)
+                     for period, shard in shards]
+            started = time.time()
+            try:
+                with self.stats.stage("composing"):
+                    return self.run_shards(tasks, workers)
+            except BaseException:
+                # A cancelled or failed export leaves none of its shard documents
+                for _, _, shard_file, _, _ in tasks:
+                    if os.path.exists(shard_file) and os.path.getmtime(shard_file) >= started:
+                        self.remove_file(shard_file)
+                raise
+
+        # Every shard continues after the last result of the previous one, so
+        # month headings are written only where the month changes
+        tasks = []
+        continue_from = None
+        for _, shard in shards or [(None, results)]:
+            tasks.append((render_shard, shard, continue_from))
+            if len(shard):
+                continue_from = shard.last_date()
+
+        partial_file_name = output_file_name + ".part"
+        try:
+            # Bodies are written while later shards are still rendered, only
+            # the few finished ahead of the next one are held in memory
+            with self.stats.stage("composing"):
+                with StreamingDocxWriter(partial_file_name, template=self.template) as writer:
+                    for body in self.iter_shards(tasks, workers):
+                        writer.write(body)
+            self.report_progress("writing", 1, 1)
+            os.replace(partial_file_name, output_file_name)
+        except BaseException:
+            self.remove_file(partial_file_name)
+            raise
+        return [output_file_name]
+
+    def compose_doc_by_structure(self, sheet_name, structure):
+        writer = DocxWriter()
+        results = self.gather_by_structure(sheet_name, structure).sorted()
+        self.write_report(writer, results)
+        return writer.doc
+
+    def save_results(self, sheet_name, output_file_name, structure, engine="docx"):
+        return self.save_results_by_structures(sheet_name, [(structure, output_file_name)], engine)[0]
+
+    def save_results_by_structures(self, sheet_name, outputs, engine="docx", watermarks=None, append=False,
+                                   shard_by=None, split=False, workers=None):
+        """Saves one document per (structure, output_file_name) from a single sheet scan.
+
+        With watermarks only rows added since the previous export are saved,
+        either as a new document or, with append, added to the end of the
+        existing output document. With shard_by the documents are rendered by
+        save_sharded_report, appending is then not supported. Returns the
+        number of exported results for each output, the updated watermarks
+        are left in self.watermarks.
+        """
+        if shard_by and append:
+            raise ValueError("Sharded reports cannot be appended to an existing document")
+        structures = [structure for structure, _ in outputs]
+        watermarks = watermarks or [None] * len(outputs)
+        gathered = self.gather_by_structures(sheet_name, structures, watermarks)
+        fingerprints = self.fingerprints
+
+        # Already exported rows changed since the watermark was taken,
+        # such structures are exported in full again
+        stale = [i for i, fingerprint in enumerate(fingerprints) if not fingerprint.matches()]
+        if stale:
+            # The first scan's results of these structures are dropped with
+            # their counts, the rows read again are not counted twice
+            filtered_counts = self.filtered_counts
+            for i in stale:
+                self.stats.rows_kept -= len(gathered[i])
+                self.stats.rows_filtered -= filtered_counts[i]
+                if isinstance(gathered[i], SpilledResults):
+                    gathered[i].close()
+            rows_scanned = self.stats.rows_scanned
+            regathered = self.gather_by_structures(sheet_name, [structures[i] for i in stale])
+            self.stats.rows_scanned = rows_scanned
+            for i, results, fingerprint in zip(stale, regathered, self.fingerprints):
+                gathered[i] = results
+                fingerprints[i] = fingerprint
+            self.error_rows = sorted(set(self.error_rows))
+
+        counts = []
+        self.watermarks = []
+        for (structure, output_file_name), results, fingerprint in zip(outputs, gathered, fingerprints):
+            with self.stats.stage("sorting"):
+                results = results.sorted()
+            watermark = fingerprint.watermark if fingerprint.matches() else None
+            continue_from = None
+            template = None
+            if append and watermark and watermark.last_date and os.path.exists(output_file_name):
+                continue_from = watermark.last_date
+                template = output_file_name
+
+            # Joined shards are .docx bodies, plain formats are written in one go.
+            # Results sorted on disk can only be streamed, they are not sharded
+            plain = engine_for_file(output_file_name, engine) in PLAIN_ENGINES.values()
+            if shard_by and isinstance(results, ResultTable) and (split or not plain):
+                self.save_sharded_report(results, output_file_name, shard_by, split, engine, workers)
             else:
-                print(f"Document saved, but the following rows could not be processed: {', '.join(map(str, self.error_rows))}")
-        except Exception as e:
-            print("Failed to save the document:", e)
+                self.save_report(results, output_file_name, engine, continue_from, template)
+            counts.append(len(results))
+            self.watermarks.append(fingerprint.next_watermark(results.last_date(), structure_columns(structure)))
+            if isinstance(results, SpilledResults):
+                results.close()
+        return counts
+
+    def save_merged_results(self, sources, outputs, engine="docx", workers=None):
+        """Saves one document per (structure, output_file_name) with the results of several workbooks.
+
+        sources is [(file_name, sheet_name)], sheet_name None for the first
+        sheet of the workbook, such as monthly exports of the same tests.
+        Every workbook is read and sorted in its own worker process into a
+        run file, the runs are merged by (date, name) while the document is
+        written and results repeated in overlapping exports are dropped.
+        Returns the number of saved results for each output.
+        """
+        structures = [structure for structure, _ in outputs]
+        run_dirs = [tempfile.TemporaryDirectory(prefix="lasarus-", dir=self.spill_dir) for _ in outputs]
+        try:
+            # Every worker gets its share of the memory limit
+            worker_count = min(workers or os.cpu_count() or 1, len(sources))
+            max_memory = self.max_memory // worker_count if self.max_memory else None
+            date_range = (self.date_from, self.date_to) if self.use_date_filter else (None, None)
+            tasks = [(gather_source, file_name, sheet_name, structures, *date_range, max_memory,
+                      [run_dir.name for run_dir in run_dirs])
+                     for file_name, sheet_name in sources]
+            with self.stats.stage("reading"):
+                outcomes = self.run_shards(tasks, workers, stage="reading")
+
+            for (file_name, _), (_, stats, error_rows) in zip(sources, outcomes):
+                source = os.path.basename(file_name)
+                self.stats.merge(stats, source)
+                self.error_rows.extend((source, row) for row in error_rows)
+            self.stats.drop_duplicate_errors()
 
+            counts = []
+            for i, (_, output_file_name) in enumerate(outputs):
+                runs = [source_runs[i] for source_runs, _, _ in outcomes]
+                names = sorted({name for _, _, _, run_names in runs for name in run_names}, key=name_sort_key)
+                last_dates = [last_date for _, _, last_date, _ in runs if last_date]
+                merged = SpilledResults([run_file for run_file, _, _, _ in runs], [], names,
+                                        sum(count for _, count, _, _ in runs),
+                                        max(last_dates) if last_dates else None, run_dirs[i])
+                duplicates = self.stats.rows_duplicate
+                self.save_report(self.drop_duplicates(merged), output_file_name, engine, total=len(merged))
+                counts.append(len(merged) - (self.stats.rows_duplicate - duplicates))
+                merged.close()
+            return counts
+        finally:
+            for run_dir in run_dirs:
+                run_dir.cleanup()
+
+    def drop_duplicates(self, results):
+        """Yields sorted results without repeated ones, such as rows of overlapping exports.
+
+        Equal results have the same (date, name) and follow each other in
+        sorted results, so only the data of the current (date, name) group
+        is kept to compare with.
+        """
+        group = None
+        seen = set()
+        for result in results:
+            key = (result.date, result.name)
+            if key != group:
+                group = key
+                seen = set()
+            info = tuple(result.info)
+            if info in seen:
+                self.stats.rows_duplicate += 1
+                self.stats.rows_kept -= 1
+                continue
+            seen.add(info)
+            yield result
+
+    def save_stored_results(self, store, test_id, output_file_name, engine="docx"):
+        """Saves results imported into a ResultStore, using this export's date range.
+
+        Results are streamed from the store already sorted, the workbook is
+        not read at all.
+        """
+        total = store.count_results(test_id, self.date_from, self.date_to)
+        results = store.iter_results(test_id, self.date_from, self.date_to)
+        self.save_report(results, output_file_name, engine, total=total)
+        self.stats.rows_kept += total
+        return total
+
+    @staticmethod
+    def remove_file(file_name):
+        try:
+            os.remove(file_name)
+        except FileNotFoundError:
+            pass
@@ -1,11 +1,29 @@
+import multiprocessing
+import os
 import sys
-from PySide6.QtCore import QDate, QLocale, Qt
-from PySide6.QtWidgets import QButtonGroup, QListView, QFileDialog, QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QRadioButton, QTreeView, QDialog, QFormLayout, QLineEdit, QDateEdit, QMessageBox
+from datetime import datetime, time
+from PySide6.QtCore import QDate, QLocale, Qt, QTimer
+from PySide6.QtWidgets import QAbstractItemView, QButtonGroup, QListView, QFileDialog, QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QRadioButton, QTreeView, QDialog, QFormLayout, QLineEdit, QDateEdit, QMessageBox, QProgressBar, QCheckBox, QComboBox, QTableView
 from PySide6.QtGui import QStandardItemModel, QStandardItem
 import sqlite3
-import openpyxl
-import xlrd
-from lasarus import LasarusResults
+from readers import data_row_count
+from workbook_cache import workbook_cache
+from export_worker import ExportWorker, ExportJob, ImportJob, MergedExportJob, StoreExportJob
+from watermarks import create_watermarks_table, load_watermark, save_watermark, structure_columns
+
+DB_PATH = 'app_data.db'
+
+# Files taken from a folder of exports
+WORKBOOK_EXTENSIONS = (".xlsx", ".xls", ".csv")
+
+# Save dialog file types, the plain formats are written by plain_writers
+SAVE_FILTERS = [
+    ("Word documents (*.docx)", ".docx"),
+    ("CSV (*.csv)", ".csv"),
+    ("JSON Lines (*.jsonl)", ".jsonl"),
+    ("HTML (*.html)", ".html"),
+]
+
 
 class App(QWidget):
     def __init__(self):
@@ -14,15 +32,37 @@ class App(QWidget):
         self.setWindowTitle("PsyTestResults")
         self.setGeometry(100, 100, 450, 600)
 
-        # SQLite setup
-        self.conn = sqlite3.connect('app_data.db')
-        self.cursor = self.conn.cursor()
-        self.create_table()
+        self.selected_file_path = None
+        # Several workbooks are merged into one report, selected_file_path is the first one
+        self.selected_file_paths = []
+        self.template_path = None
+
+        self.conn = None
+        self.cursor = None
 
         # UI Elements
         self.create_widgets()
 
-        # Data loading
+        # SQLite setup and data loading run once the event loop has started,
+        # so the window is shown first
+        QTimer.singleShot(0, self.init_database)
+
+        # Background exports
+        self.pending_exports = 0
+        self.current_export_name = None
+        self.export_worker = ExportWorker()
+        self.export_worker.progress.connect(self.update_export_progress)
+        self.export_worker.job_started.connect(self.export_started)
+        self.export_worker.job_finished.connect(self.export_finished)
+        self.export_worker.job_failed.connect(self.export_failed)
+        self.export_worker.job_cancelled.connect(self.export_cancelled)
+        self.export_worker.queue_changed.connect(self.update_export_queue)
+        self.export_worker.start()
+
+    def init_database(self):
+        self.conn = sqlite3.connect(DB_PATH)
+        self.cursor = self.conn.cursor()
+        self.create_table()
         self.load_data()
 
     def create_table(self):
@@ -35,6 +75,7 @@ class App(QWidget):
                 DataColumn TEXT
             )
         ''')
+        create_watermarks_table(self.cursor)
         self.conn.commit()
 
         # Insert default data if the table is empty
@@ -61,16 +102,24 @@ class App(QWidget):
         self.selected_file_label = QLabel("Файл не вибрано")
         main_layout.addWidget(self.selected_file_label)
 
-        # Top-left button for open file
+        # Top-left buttons for open files or a folder of exports
+        open_layout = QHBoxLayout()
         self.open_file_button = QPushButton("Відкрити")
         self.open_file_button.clicked.connect(self.open_file)
-        main_layout.addWidget(self.open_file_button)
+        open_layout.addWidget(self.open_file_button)
+
+        self.open_folder_button = QPushButton("Відкрити папку")
+        self.open_folder_button.clicked.connect(self.open_folder)
+        open_layout.addWidget(self.open_folder_button)
+        main_layout.addLayout(open_layout)
 
 
         # List for items (show only Name)
         tests_label = QLabel("Тести")
         main_layout.addWidget(tests_label)
         self.listview = QListView(self)
+        # Several tests can be exported from one sheet scan
+        self.listview.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.model = QStandardItemModel(self.listview)
         self.listview.setModel(self.model)
         main_layout.addWidget(self.listview)
@@ -144,13 +193,100 @@ class App(QWidget):
         self.sheet_listview.setModel(self.sheet_model)
         main_layout.addWidget(self.sheet_listview)
 
-        # Save button
+        # Full export or only the rows added since the previous export
+        self.export_mode_combo = QComboBox(self)
+        self.export_mode_combo.addItem("Усі результати", "full")
+        self.export_mode_combo.addItem("Лише нові результати (окремий файл)", "delta")
+        self.export_mode_combo.addItem("Лише нові результати (дописати у звіт)", "append")
+        main_layout.addWidget(self.export_mode_combo)
+
+        # Sharded rendering in worker processes: (shard_by, split)
+        self.shard_combo = QComboBox(self)
+        self.shard_combo.addItem("Один документ", (None, False))
+        self.shard_combo.addItem("Один документ, паралельне формування по місяцях", ("month", False))
+        self.shard_combo.addItem("Окремий документ на кожен місяць", ("month", True))
+        self.shard_combo.addItem("Окремий документ на кожен рік", ("year", True))
+        main_layout.addWidget(self.shard_combo)
+
+        # Output format: the default file type of the save dialog and the
+        # format of one-file-per-test exports
+        self.format_combo = QComboBox(self)
+        for file_filter, extension in SAVE_FILTERS:
+            self.format_combo.addItem(file_filter, extension)
+        main_layout.addWidget(self.format_combo)
+
+        # Output engine: python-docx or streaming document.xml writer
+        self.stream_checkbox = QCheckBox("Потоковий запис (для великих звітів)")
+        main_layout.addWidget(self.stream_checkbox)
+
+        # Export results imported into the database instead of the file
+        self.store_checkbox = QCheckBox("Дані з бази результатів")
+        main_layout.addWidget(self.store_checkbox)
+
+        # Run report written next to the document
+        self.report_combo = QComboBox(self)
+        self.report_combo.addItem("Без звіту про виконання", None)
+        self.report_combo.addItem("Звіт про виконання (JSON)", "json")
+        self.report_combo.addItem("Помилки рядків (CSV)", "csv")
+        main_layout.addWidget(self.report_combo)
+
+        # Report template with the Lasarus styles, the default look if not chosen
+        template_layout = QHBoxLayout()
+        self.template_label = QLabel("Шаблон звіту: стандартний")
+        template_layout.addWidget(self.template_label)
+
+        template_button = QPushButton("Вибрати шаблон")
+        template_button.clicked.connect(self.choose_template)
+        template_layout.addWidget(template_button)
+
+        reset_template_button = QPushButton("Стандартний")
+        reset_template_button.clicked.connect(self.reset_template)
+        template_layout.addWidget(reset_template_button)
+
+        main_layout.addLayout(template_layout)
+
+        # Import and save buttons
+        save_layout = QHBoxLayout()
+
+        self.import_button = QPushButton("Імпортувати в базу")
+        self.import_button.clicked.connect(self.import_data)
+        save_layout.addWidget(self.import_button)
+
         self.save_button = QPushButton("Зберегти")
         self.save_button.clicked.connect(self.save_data)
-        main_layout.addWidget(self.save_button)
+        save_layout.addWidget(self.save_button)
+
+        main_layout.addLayout(save_layout)
+
+        # Export progress
+        self.export_status_label = QLabel("")
+        self.export_status_label.setWordWrap(True)
+        main_layout.addWidget(self.export_status_label)
+
+        progress_layout = QHBoxLayout()
+        self.export_progress = QProgressBar(self)
+        self.export_progress.setVisible(False)
+        progress_layout.addWidget(self.export_progress)
+
+        self.cancel_button = QPushButton("Скасувати")
+        self.cancel_button.clicked.connect(self.cancel_export)
+        self.cancel_button.setVisible(False)
+        progress_layout.addWidget(self.cancel_button)
+
+        main_layout.addLayout(progress_layout)
 
         self.setLayout(main_layout)
 
+    def choose_template(self):
+        template_path, _ = QFileDialog.getOpenFileName(self, "Шаблон звіту", "", "Word documents (*.docx)")
+        if template_path:
+            self.template_path = template_path
+            self.template_label.setText(f"Шаблон звіту: {os.path.basename(template_path)}")
+
+    def reset_template(self):
+        self.template_path = None
+        self.template_label.setText("Шаблон звіту: стандартний")
+
     def toggle_date_pickers(self):
         if self.radiobutton_time.isChecked():
             self.start_date.setVisible(True)
@@ -169,37 +305,71 @@ class App(QWidget):
             self.model.appendRow(item)
 
     def open_file(self):
-        # Let the user select an Excel file
-        file_path, _ = QFileDialog.getOpenFileName(self, "Виберіть файл", "", "Excel files (*.xls *.xlsx)")
-        if file_path:
-            # Store the file path and update the label with the selected file's name
-            self.selected_file_path = file_path
-            file_name = file_path.split("/")[-1]
-            self.selected_file_label.setText(f"Вибрано: {file_name}")
-
-            # Clear the sheet_listview before adding any sheet names
-            self.sheet_model.clear()
-            self.open_excel_file(file_path)
+        # Let the user select one or several Excel files
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Виберіть файли", "", "Excel files (*.xls *.xlsx);;CSV files (*.csv)")
+        if file_paths:
+            self.open_files(file_paths)
+
+    def open_folder(self):
+        # Every workbook of the folder, such as monthly exports
+        folder = QFileDialog.getExistingDirectory(self, "Виберіть папку з файлами")
+        if not folder:
+            return
+        file_paths = [os.path.join(folder, name) for name in sorted(os.listdir(folder))
+                      if name.lower().endswith(WORKBOOK_EXTENSIONS)]
+        if not file_paths:
+            QMessageBox.warning(self, "Відкрити папку", "У папці немає файлів Excel або CSV.")
+            return
+        self.open_files(file_paths)
+
+    def open_files(self, file_paths):
+        # Store the file paths and update the label with the selected files' names
+        self.selected_file_paths = file_paths
+        self.selected_file_path = file_paths[0]
+        file_names = [os.path.basename(file_path) for file_path in file_paths]
+        if len(file_names) == 1:
+            self.selected_file_label.setText(f"Вибрано: {file_names[0]}")
+        else:
+            self.selected_file_label.setText(f"Вибрано файлів: {len(file_names)} ({', '.join(file_names)})")
+
+        # Clear the sheet_listview before adding any sheet names
+        self.sheet_model.clear()
+        if len(file_paths) == 1:
+            self.open_excel_file(file_paths[0])
+        else:
+            self.open_excel_files(file_paths)
 
     def open_excel_file(self, file_path):
-        # Try opening with openpyxl (for .xlsx files)
+        # Only the workbook metadata is read here, cells are loaded on export
         try:
-            wb = openpyxl.load_workbook(file_path, keep_vba=False)
-            sheet_names = wb.sheetnames
-            self.populate_listview_with_sheet_names(sheet_names)
+            sheets = workbook_cache.list_sheets(file_path)
         except Exception as e:
-            # If openpyxl fails, try xlrd for older .xls files
-            try:
-                wb = xlrd.open_workbook(file_path)
-                sheet_names = wb.sheet_names()
-                self.populate_listview_with_sheet_names(sheet_names)
-            except Exception as e:
-                QMessageBox.critical(self, "Помилка", f"Не вдалося відкрити файл: {e}")
+            QMessageBox.critical(self, "Помилка", f"Не вдалося відкрити файл: {e}")
+            return
+        self.populate_listview_with_sheet_names([(sheet, data_row_count(row_count)) for sheet, row_count in sheets])
 
-    def populate_listview_with_sheet_names(self, sheet_names):
-        # Populate sheet_listview with sheet names
-        for sheet in sheet_names:
-            item = QStandardItem(sheet)
+    def open_excel_files(self, file_paths):
+        # Only sheets found in every workbook can be merged, their row counts are added up
+        try:
+            workbooks = [dict(workbook_cache.list_sheets(file_path)) for file_path in file_paths]
+        except Exception as e:
+            QMessageBox.critical(self, "Помилка", f"Не вдалося відкрити файл: {e}")
+            return
+        sheets = []
+        for sheet in workbooks[0]:
+            if all(sheet in workbook for workbook in workbooks):
+                row_counts = [data_row_count(workbook[sheet]) for workbook in workbooks]
+                sheets.append((sheet, None if None in row_counts else sum(row_counts)))
+        if not sheets:
+            QMessageBox.warning(self, "Відкрити файли", "У вибраних файлах немає листа з однаковою назвою.")
+        self.populate_listview_with_sheet_names(sheets)
+
+    def populate_listview_with_sheet_names(self, sheets):
+        # Populate sheet_listview with sheet names and data row counts if known
+        for sheet, row_count in sheets:
+            text = sheet if row_count is None else f"{sheet} (рядків: {row_count})"
+            item = QStandardItem(text)
+            item.setData(sheet, Qt.UserRole)
             self.sheet_model.appendRow(item)
 
     def add_item(self):
@@ -219,9 +389,10 @@ class App(QWidget):
     def open_item_dialog(self, item_data=None):
         dialog = QDialog(self)
         dialog.setWindowTitle("Добавити / Редагувати")
-        dialog.setFixedSize(300, 250)
 
-        form_layout = QFormLayout(dialog)
+        dialog_layout = QVBoxLayout(dialog)
+        form_layout = QFormLayout()
+        dialog_layout.addLayout(form_layout)
 
         # Fields
         name_entry = QLineEdit(dialog)
@@ -241,6 +412,45 @@ class App(QWidget):
             date_col_entry.setText(item_data[3])
             data_col_entry.setText(item_data[4])
 
+        # Preview of the open sheet read with the typed columns
+        preview_model = None
+        preview_sheet = self.preview_sheet_name()
+        if preview_sheet:
+            # The preview brings the readers and lasarus, imported on first use
+            from sheet_preview import SheetPreviewModel
+            try:
+                preview_model = SheetPreviewModel(self.selected_file_path, preview_sheet, dialog)
+            except Exception as e:
+                dialog_layout.addWidget(QLabel(f"Не вдалося відкрити лист для перегляду: {e}"))
+
+        if preview_model:
+            dialog_layout.addWidget(QLabel(f"Перегляд листа: {preview_sheet}"))
+            preview_view = QTableView(dialog)
+            preview_view.setModel(preview_model)
+            preview_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+            dialog_layout.addWidget(preview_view)
+            dialog.resize(900, 600)
+
+            def update_preview():
+                preview_model.set_structure({
+                    'name_column': name_col_entry.text(),
+                    'date_column': date_col_entry.text(),
+                    'data_columns': data_col_entry.text(),
+                })
+                preview_view.resizeColumnToContents(0)
+
+            # Re-read the sheet once typing pauses
+            preview_timer = QTimer(dialog)
+            preview_timer.setSingleShot(True)
+            preview_timer.setInterval(300)
+            preview_timer.timeout.connect(update_preview)
+            for entry in (name_col_entry, date_col_entry, data_col_entry):
+                entry.textChanged.connect(preview_timer.start)
+            dialog.finished.connect(preview_model.close)
+            update_preview()
+        else:
+            dialog.setFixedSize(300, 250)
+
         def save_item():
             name = name_entry.text()
             name_col = name_col_entry.text()
@@ -260,7 +470,7 @@ class App(QWidget):
 
         save_button = QPushButton("Save", dialog)
         save_button.clicked.connect(save_item)
-        form_layout.addWidget(save_button)
+        dialog_layout.addWidget(save_button)
         
 
         dialog.exec()
@@ -278,54 +488,235 @@ class App(QWidget):
             QMessageBox.warning(self, "Видалити елемент", "Будь ласка, виберіть елемент для видалення.")
 
 
-    def save_data(self):
-        selected_item = self.listview.selectionModel().selectedIndexes()
-        
-        if selected_item:
-            item_id = self.model.itemFromIndex(selected_item[0]).data(Qt.UserRole)
+    def selected_tests(self):
+        items_data = []
+        for index in self.listview.selectionModel().selectedIndexes():
+            item_id = self.model.itemFromIndex(index).data(Qt.UserRole)
             self.cursor.execute("SELECT * FROM TestStructures WHERE id=?", (item_id,))
-            item_data = self.cursor.fetchone()
+            items_data.append(self.cursor.fetchone())
+        return items_data
+
+    @staticmethod
+    def structure_from_row(item_data):
+        # Create structure for LasarusResults
+        return {
+            'name_column': item_data[2],  # NameColumn
+            'date_column': item_data[3],  # DateColumn
+            'data_columns': item_data[4]  # DataColumn
+        }
+
+    def selected_sheet_name(self):
+        if not self.selected_file_path:
+            QMessageBox.warning(self, "Виберіть файл", "Спочатку відкрийте файл з даними.")
+            return None
+        selected_sheet = self.sheet_listview.selectionModel().selectedIndexes()
+        if not selected_sheet:
+            QMessageBox.warning(self, "Виберіть лист", "Виберіть лист зі списку.")
+            return None
+        return self.sheet_model.itemFromIndex(selected_sheet[0]).data(Qt.UserRole)
+
+    def preview_sheet_name(self):
+        # The selected sheet, or the first one, without asking the user
+        if not self.selected_file_path or not self.sheet_model.rowCount():
+            return None
+        selected_sheet = self.sheet_listview.selectionModel().selectedIndexes()
+        item = self.sheet_model.itemFromIndex(selected_sheet[0]) if selected_sheet else self.sheet_model.item(0)
+        return item.data(Qt.UserRole)
+
+    def import_data(self):
+        items_data = self.selected_tests()
+        if not items_data:
+            QMessageBox.warning(self, "Імпорт", "Будь ласка, виберіть тест для імпорту.")
+            return
+        sheet_name = self.selected_sheet_name()
+        if not sheet_name:
+            return
+        structures = [(item_data[0], self.structure_from_row(item_data)) for item_data in items_data]
+        # Every workbook keeps its own imported results
+        for file_path in self.selected_file_paths:
+            self.export_worker.add_job(ImportJob(file_path, sheet_name, structures, DB_PATH))
 
-            selected_sheet = self.sheet_listview.selectionModel().selectedIndexes()
-            if selected_sheet:
-                sheet_name = self.sheet_listview.model().data(selected_sheet[0])
+    def save_data(self):
+        items_data = self.selected_tests()
+        
+        if items_data:
+            from_store = self.store_checkbox.isChecked()
+            if from_store:
+                sheet_name = None
             else:
-                QMessageBox.warning(self, "Виберіть лист", "Виберіть лист зі списку.")
-                return
-            
-            default_filename = item_data[1] 
-            save_path, _ = QFileDialog.getSaveFileName(self, "Зберегти файл", default_filename, "Word documents (*.docx)")
+                sheet_name = self.selected_sheet_name()
+                if not sheet_name:
+                    return
             
-            if not save_path:
+            export_mode = self.export_mode_combo.currentData()
+            date_checked_id = self.date_button_group.checkedId()
+            if export_mode != "full" and (date_checked_id != 1 or from_store):
+                QMessageBox.warning(self, "Лише нові результати", "Режим лише нових результатів працює тільки для усіх даних з файлу.")
+                return
+            shard_by, split = self.shard_combo.currentData()
+            if shard_by and (export_mode == "append" or from_store):
+                QMessageBox.warning(self, "Розбиття звіту", "Розбиття звіту працює тільки для нового звіту з файлу.")
+                return
+            merged = len(self.selected_file_paths) > 1 and not from_store
+            if merged and (export_mode != "full" or shard_by):
+                QMessageBox.warning(self, "Кілька файлів", "Звіт з кількох файлів можна тільки створити заново, без розбиття.")
                 return
-            
-            # Create structure for LasarusResults
-            structure = {
-                'name_column': item_data[2],  # NameColumn
-                'date_column': item_data[3],  # DateColumn
-                'data_columns': item_data[4]  # DataColumn
-            }
 
-            date_checked_id = self.date_button_group.checkedId()
+            extension = self.format_combo.currentData()
+            if len(items_data) == 1:
+                default_filename = items_data[0][1] + extension
+                # Appending writes into an existing report on purpose
+                options = QFileDialog.DontConfirmOverwrite if export_mode == "append" else QFileDialog.Options()
+                file_filters = ";;".join(file_filter for file_filter, _ in SAVE_FILTERS)
+                save_path, selected_filter = QFileDialog.getSaveFileName(
+                    self, "Зберегти файл", default_filename, file_filters, self.format_combo.currentText(),
+                    options=options)
+                if not save_path:
+                    return
+                # The chosen file type decides the format when no known extension was typed
+                extension = dict(SAVE_FILTERS).get(selected_filter, extension)
+                if os.path.splitext(save_path)[1].lower() not in dict(SAVE_FILTERS).values():
+                    save_path += extension
+                save_paths = [save_path]
+            else:
+                # One document per test, named after the test
+                save_dir = QFileDialog.getExistingDirectory(self, "Виберіть папку для збереження")
+                if not save_dir:
+                    return
+                from lasarus import safe_file_name, unique_file_name
+                used = set()
+                save_paths = [unique_file_name(os.path.join(save_dir, safe_file_name(f"{item_data[1]}{extension}")), used)
+                              for item_data in items_data]
+                # Appending writes into the existing reports on purpose
+                existing = [os.path.basename(path) for path in save_paths if os.path.exists(path)]
+                if existing and export_mode != "append":
+                    confirm = QMessageBox.question(self, "Замінити файли",
+                                                   "Ці файли вже існують і будуть замінені:\n" + "\n".join(existing))
+                    if confirm != QMessageBox.Yes:
+                        return
+
+            outputs = []
+            watermarks = []
+            for item_data, save_path in zip(items_data, save_paths):
+                structure = self.structure_from_row(item_data)
+                outputs.append((structure, save_path))
+
+                watermark = None
+                if export_mode != "full":
+                    watermark = load_watermark(self.cursor, self.selected_file_path, sheet_name, item_data[0])
+                    # Changed column mapping means the old watermark does not apply
+                    if watermark and watermark.columns != structure_columns(structure):
+                        watermark = None
+                watermarks.append(watermark)
+
             if date_checked_id == 1:
-                lasarus_results = LasarusResults(self.selected_file_path)
+                date_from = None
+                date_to = None
             else:
-                date_from = self.start_date.date()
-                date_to = self.end_date.date()
-                lasarus_results = LasarusResults(self.selected_file_path, date_from, date_to)    
+                date_from = datetime.combine(self.start_date.date().toPython(), time.min)
+                date_to = datetime.combine(self.end_date.date().toPython(), time.max)
+
+            engine = "stream" if self.stream_checkbox.isChecked() else "docx"
+            if from_store:
+                # Indexed range query on the imported results
+                store_outputs = [(item_data[0], save_path) for item_data, save_path in zip(items_data, save_paths)]
+                job = StoreExportJob(store_outputs, DB_PATH, date_from, date_to, engine)
+                job.report_format = self.report_combo.currentData()
+                job.template = self.template_path
+                self.export_worker.add_job(job)
+                return
+
+            if merged:
+                # One report per test from all selected workbooks, duplicates dropped
+                job = MergedExportJob(self.selected_file_paths, sheet_name, outputs, date_from, date_to, engine)
+                job.report_format = self.report_combo.currentData()
+                job.template = self.template_path
+                self.export_worker.add_job(job)
+                return
 
-            lasarus_results.save_results(sheet_name, save_path, structure)
-            QMessageBox.information(self, "Збереження", "Дані успішно збережено.")
+            job = ExportJob(self.selected_file_path, sheet_name, outputs, date_from, date_to, engine)
+            job.structure_ids = [item_data[0] for item_data in items_data]
+            job.watermarks = watermarks
+            job.append = export_mode == "append"
+            job.shard_by = shard_by
+            job.split = split
+            job.report_format = self.report_combo.currentData()
+            job.template = self.template_path
+            self.export_worker.add_job(job)
     
         else:
             QMessageBox.warning(self, "Зберегти дані", "Будь ласка, виберіть тест для збереження.")
     
 
+    def update_export_progress(self, stage, done, total):
+        stage_names = {"reading": "Читання", "storing": "Запис у базу", "composing": "Формування", "writing": "Запис"}
+        self.export_progress.setFormat(f"{stage_names.get(stage, stage)}: %v / %m")
+        self.export_progress.setMaximum(total)
+        self.export_progress.setValue(done)
+
+    def update_export_queue(self, pending):
+        self.pending_exports = pending
+        if self.current_export_name:
+            self.show_export_status()
+
+    def show_export_status(self):
+        text = f"Експорт: {self.current_export_name}"
+        if self.pending_exports:
+            text += f" (у черзі: {self.pending_exports})"
+        self.export_status_label.setText(text)
+
+    def export_started(self, job):
+        self.current_export_name = job.display_name()
+        self.export_progress.setMaximum(0)
+        self.export_progress.setVisible(True)
+        self.cancel_button.setVisible(True)
+        self.show_export_status()
+
+    def export_done(self, text):
+        self.current_export_name = None
+        self.export_progress.setVisible(False)
+        self.cancel_button.setVisible(False)
+        self.export_status_label.setText(text)
+
+    def export_finished(self, job):
+        if isinstance(job, ImportJob):
+            self.export_done(f"Імпортовано результатів: {job.imported}. Рядки з помилками: {len(job.error_rows)}\n"
+                             f"{job.stats.summary()}")
+            return
+
+        # Watermarks only describe exports of all data, not of a period
+        if isinstance(job, ExportJob) and job.date_from is None and job.date_to is None:
+            for structure_id, watermark in zip(job.structure_ids, job.new_watermarks):
+                save_watermark(self.cursor, job.file_path, job.sheet_name, structure_id, watermark)
+            self.conn.commit()
+
+        text = f"Збережено: {job.display_name()}"
+        if job.error_rows:
+            text += f". Рядки з помилками: {len(job.error_rows)}"
+        text += f"\n{job.stats.summary()}"
+        if job.report_file_name():
+            text += f"\nЗвіт: {os.path.basename(job.report_file_name())}"
+        self.export_done(text)
+
+    def export_failed(self, job, message):
+        self.export_done("")
+        QMessageBox.critical(self, "Помилка", f"Не вдалося зберегти файл: {message}")
+
+    def export_cancelled(self, job):
+        self.export_done("Експорт скасовано")
+
+    def cancel_export(self):
+        self.export_worker.cancel()
+
     def closeEvent(self, event):
-        self.conn.close()
+        self.export_worker.stop()
+        if self.conn:
+            self.conn.close()
         event.accept()
 
 if __name__ == "__main__":
+    # Sharded exports start worker processes, needed for the frozen build
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = App()
     window.show()
@@ -0,0 +1,232 @@
+"""Plain report formats for analysts and other programs: CSV, JSON Lines and HTML.
+
+The writers take the same calls as the .docx writers and stream every
+result straight into the output file, so memory does not grow with the
+report. Only the month and person grouping of the report is kept, there
+is no Word formatting to build.
+"""
+import csv
+import html
+import io
+import json
+import os
+import shutil
+from itertools import repeat
+from result_table import month_title
+
+
+# Dates of the machine readable formats, sortable as text
+PLAIN_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Characters of CSV rows written one by one kept before they go to the file
+FLUSH_SIZE = 1024 * 1024
+
+
+class PlainWriter:
+    """Base of the plain writers.
+
+    Subclasses write results one by one in add_result() and a slice of a
+    ResultTable (results of one month) in add_table(), with whole columns
+    converted at once.
+
+    template is ignored unless it is a previous report of the same format,
+    the new results are then added to its end.
+    """
+
+    extension = None
+    encoding = "utf-8"
+    newline = None
+    # Written by close(), removed again from a report that is continued
+    tail = ""
+
+    def __init__(self, file_name, template=None):
+        continued = (isinstance(template, str) and template.lower().endswith(self.extension)
+                     and os.path.exists(template))
+        if continued:
+            self.continue_report(template, file_name)
+            self.file = open(file_name, "a", encoding=self.encoding, newline=self.newline)
+        else:
+            self.file = open(file_name, "w", encoding=self.encoding, newline=self.newline)
+        try:
+            self.start(continued)
+        except BaseException:
+            self.file.close()
+            raise
+
+    def continue_report(self, previous_file_name, file_name):
+        # Copied without being read into memory, then cut before its tail
+        shutil.copyfile(previous_file_name, file_name)
+        tail = self.tail.encode(self.encoding)
+        if not tail:
+            return
+        with open(file_name, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(size - len(tail), 0))
+            if f.read() == tail:
+                f.truncate(size - len(tail))
+
+    def start(self, continued):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def close(self):
+        self.file.write(self.tail)
+        self.file.close()
+
+    def abort(self):
+        self.file.close()
+
+    def add_toc(self):
+        pass
+
+    def add_date_break(self, text):
+        pass
+
+    def add_page_break(self):
+        pass
+
+
+class CsvReportWriter(PlainWriter):
+    """One row per result: month, name, date and one column per data column."""
+
+    extension = ".csv"
+    newline = ""
+
+    def start(self, continued):
+        # Rows are collected in memory and written in one call per table
+        # slice, csv.writer writes every row to its file separately
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.header_written = continued
+        if not continued:
+            # Excel only reads the file as UTF-8 with the BOM
+            self.file.write("\ufeff")
+
+    def flush(self):
+        self.file.write(self.buffer.getvalue())
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+    def write_header(self, data_column_count):
+        if not self.header_written:
+            self.writer.writerow(["month", "name", "date"] + [f"data_{i}" for i in range(1, data_column_count + 1)])
+            self.header_written = True
+
+    def add_table(self, month, table):
+        self.write_header(len(table.info))
+        self.writer.writerows(zip(repeat(month), table.name_list(), table.date_texts(),
+                                  *[column.tolist() for column in table.info]))
+        self.flush()
+
+    def add_result(self, result):
+        self.write_header(len(result.info))
+        self.writer.writerow([month_title(result.date), result.name, result.date.strftime(PLAIN_DATE_FORMAT),
+                              *result.info])
+        if self.buffer.tell() >= FLUSH_SIZE:
+            self.flush()
+
+
+class JsonLinesWriter(PlainWriter):
+    """One JSON object per line and result."""
+
+    extension = ".jsonl"
+
+    def start(self, continued):
+        # Cells such as dates in data columns are written as text
+        self.encode = json.JSONEncoder(ensure_ascii=False, default=str).encode
+
+    def add_table(self, month, table):
+        encode = self.encode
+        lines = [encode({"month": month, "name": name, "date": date, "info": list(info)})
+                 for name, date, *info in zip(table.name_list(), table.date_texts(),
+                                              *[column.tolist() for column in table.info])]
+        lines.append("")
+        self.file.write("\n".join(lines))
+
+    def add_result(self, result):
+        record = {"month": month_title(result.date), "name": result.name,
+                  "date": result.date.strftime(PLAIN_DATE_FORMAT), "info": result.info}
+        self.file.write(self.encode(record))
+        self.file.write("\n")
+
+
+HTML_HEAD = """<!DOCTYPE html>
+<html lang="uk">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: Calibri, Arial, sans-serif; max-width: 60em; margin: 2em auto; }}
+h1, h2 {{ font-family: "Calibri Light", Arial, sans-serif; font-weight: normal; color: #2f5496; }}
+h1 {{ font-size: 16pt; margin: 12pt 0 6pt; }}
+h2 {{ font-size: 16pt; margin: 6pt 0 0; }}
+section {{ margin-bottom: 1.5em; }}
+p {{ margin: 0; text-indent: 12pt; }}
+</style>
+</head>
+<body>
+"""
+
+
+class HtmlReportWriter(PlainWriter):
+    """A single HTML page with the month headings and a section per result."""
+
+    extension = ".html"
+    tail = "</body>\n</html>\n"
+
+    def start(self, continued):
+        if not continued:
+            title = os.path.splitext(os.path.basename(self.file.name))[0]
+            if title.endswith(".html"):
+                # The .part file of save_report
+                title = title[:-len(".html")]
+            self.file.write(HTML_HEAD.format(title=html.escape(title)))
+
+    def add_date_break(self, text):
+        self.file.write(f"<h1>{html.escape(text)}</h1>\n")
+
+    @staticmethod
+    def result_html(name, date_text, info, parts):
+        parts.append(f"<section>\n<h2>{html.escape(str(name))}</h2>\n<p>{date_text}</p>\n")
+        for value in info:
+            # The first sentence of a data cell is bold, "|" separates paragraphs
+            for i, paragraph in enumerate(str(value).split("|")):
+                first_sentence_end = paragraph.find('.') + 1
+                if i == 0 and first_sentence_end > 0:
+                    parts.append(f"<p><b>{html.escape(paragraph[:first_sentence_end])}</b>"
+                                 f"{html.escape(paragraph[first_sentence_end:])}</p>\n")
+                else:
+                    parts.append(f"<p>{html.escape(paragraph)}</p>\n")
+        parts.append("</section>\n")
+
+    def add_table(self, month, table):
+        parts = []
+        for name, date, *info in zip(table.name_list(), table.date_texts(), *[column.tolist() for column in table.info]):
+            # "YYYY-MM-DD HH:MM:SS" shown as DD-MM-YYYY like in the .docx report
+            self.result_html(name, f"{date[8:10]}-{date[5:7]}-{date[:4]}{date[10:]}", info, parts)
+        self.file.write("".join(parts))
+
+    def add_result(self, result):
+        parts = []
+        self.result_html(result.name, result.date.strftime('%d-%m-%Y %H:%M:%S'), result.info, parts)
+        self.file.write("".join(parts))
+
+
+# Output file extension -> engine name in lasarus.ENGINES
+PLAIN_ENGINES = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".html": "html",
+}
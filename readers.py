@@ -0,0 +1,320 @@
+import csv
+import os
+import re
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+
+XLSX_SIGNATURE = b"PK\x03\x04"
+XLS_SIGNATURE = b"\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1"
+CSV_EXTENSIONS = (".csv", ".txt")
+CSV_DELIMITERS = ",;\t"
+# CSV dumps have no sheets, all of them get the same one so they can be merged
+CSV_SHEET_NAME = "CSV"
+
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# <dimension> is written before <sheetData>, so the head of the part is enough
+DIMENSION_PATTERN = re.compile(rb'<(?:\w+:)?dimension\s+ref="([A-Z]*\d*:)?[A-Z]*(\d+)"')
+DIMENSION_CHUNK = 4096
+
+# Rows of an .xls sheet converted at once
+XLS_ROW_BLOCK = 1000
+
+# Date formats accepted in text sources such as CSV dumps
+TEXT_DATE_FORMATS = ["%d.%m.%Y %H:%M:%S", "%d.%m.%Y %H:%M", "%d.%m.%Y", "%d-%m-%Y %H:%M:%S", "%d/%m/%Y %H:%M:%S"]
+
+
+def detect_format(file_path):
+    with open(file_path, "rb") as f:
+        signature = f.read(8)
+    if signature.startswith(XLSX_SIGNATURE):
+        return "xlsx"
+    if signature == XLS_SIGNATURE:
+        return "xls"
+    if file_path.lower().endswith(CSV_EXTENSIONS):
+        return "csv"
+    extension = os.path.splitext(file_path)[1].lower().lstrip(".")
+    if extension in READERS:
+        return extension
+    raise ValueError(f"Unsupported file format: {file_path}")
+
+
+def list_sheets(file_path):
+    """Returns [(sheet_name, row_count)] without loading any cells.
+
+    row_count is None when it cannot be read cheaply.
+    """
+    return open_reader(file_path).list_sheets()
+
+
+def data_row_count(row_count):
+    """Rows under the header row of a sheet with row_count rows, None if unknown."""
+    if row_count is None:
+        return None
+    return max(row_count - 1, 0)
+
+
+def parse_text_date(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for date_format in TEXT_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    return value
+
+
+class XlsxReader:
+    """Streams rows of an .xlsx workbook with openpyxl's worksheet parser."""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.sheets = None
+
+    def sheet_names(self):
+        return [name for name, _ in self.list_sheets()]
+
+    def row_count(self, sheet_name):
+        return dict(self.list_sheets()).get(sheet_name)
+
+    def list_sheets(self):
+        if self.sheets is None:
+            with zipfile.ZipFile(self.file_path) as archive:
+                workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+                rels = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+                targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(f"{PACKAGE_REL_NS}Relationship")}
+
+                self.sheets = []
+                for sheet in workbook.iter(f"{MAIN_NS}sheet"):
+                    target = targets.get(sheet.get(f"{REL_NS}id"))
+                    self.sheets.append((sheet.get("name"), self.read_row_count(archive, target)))
+        return self.sheets
+
+    @staticmethod
+    def read_row_count(archive, target):
+        if not target:
+            return None
+        if target.startswith("/"):
+            part_name = target.lstrip("/")
+        else:
+            part_name = posixpath.normpath(posixpath.join("xl", target))
+        try:
+            with archive.open(part_name) as part:
+                head = part.read(DIMENSION_CHUNK)
+        except KeyError:
+            return None
+        match = DIMENSION_PATTERN.search(head)
+        if not match:
+            return None
+        return int(match.group(2))
+
+    def iter_rows(self, sheet_name, first_col, last_col):
+        """Yields data rows (from row 2) as tuples of the 0-based column window.
+
+        load_workbook(read_only=True) sizes every sheet while opening and
+        parses a sheet without <dimension> in full to do it, over a minute on
+        large exports. The requested sheet is parsed directly with openpyxl's
+        worksheet parser instead. It is not public API, so the openpyxl
+        version is pinned and the read-only workbook is used when the parser
+        cannot be imported.
+        """
+        # openpyxl and xlrd are imported on first use, they add a good part
+        # of the application's startup time
+        try:
+            from openpyxl.reader.excel import ExcelReader
+            from openpyxl.styles.stylesheet import apply_stylesheet
+            from openpyxl.worksheet._reader import WorkSheetParser
+        except ImportError:
+            yield from self.iter_workbook_rows(sheet_name, first_col, last_col)
+            return
+
+        reader = ExcelReader(self.file_path, read_only=True)
+        try:
+            reader.read_manifest()
+            reader.read_strings()
+            reader.read_workbook()
+            apply_stylesheet(reader.archive, reader.wb)
+            targets = {sheet.name: rel.target for sheet, rel in reader.parser.find_sheets()}
+            if sheet_name not in targets:
+                raise KeyError(f"Worksheet {sheet_name} does not exist.")
+
+            wb = reader.wb
+            width = last_col - first_col + 1
+            empty_row = (None,) * width
+            with reader.archive.open(targets[sheet_name]) as source:
+                parser = WorkSheetParser(source, reader.shared_strings, epoch=wb.epoch,
+                                         date_formats=wb._date_formats, timedelta_formats=wb._timedelta_formats)
+                next_row = 2
+                for row_idx, cells in parser.parse():
+                    if row_idx < next_row:
+                        continue
+                    # Rows missing from the sheet are read as empty ones
+                    for _ in range(next_row, row_idx):
+                        yield empty_row
+                    window = [None] * width
+                    for cell in cells:
+                        position = cell['column'] - 1 - first_col
+                        if 0 <= position < width:
+                            window[position] = cell['value']
+                    yield tuple(window)
+                    next_row = row_idx + 1
+        finally:
+            reader.archive.close()
+
+    def iter_workbook_rows(self, sheet_name, first_col, last_col):
+        """iter_rows() through the public read-only workbook."""
+        import openpyxl
+
+        wb = openpyxl.load_workbook(self.file_path, read_only=True)
+        try:
+            sheet = wb[sheet_name]
+            # Exporters do not always write a correct <dimension>, so let the
+            # reader find the real extent of the sheet itself.
+            sheet.reset_dimensions()
+            yield from sheet.iter_rows(min_row=2, min_col=first_col + 1, max_col=last_col + 1, values_only=True)
+        finally:
+            wb.close()
+
+
+class XlsReader:
+    """Reads legacy .xls workbooks with xlrd, one sheet in memory at a time."""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.sheets = None
+
+    def sheet_names(self):
+        return [name for name, _ in self.list_sheets()]
+
+    def row_count(self, sheet_name):
+        return dict(self.list_sheets()).get(sheet_name)
+
+    def list_sheets(self):
+        if self.sheets is None:
+            import xlrd
+            # on_demand only parses the workbook globals, sheets stay unloaded
+            wb = xlrd.open_workbook(self.file_path, on_demand=True)
+            try:
+                self.sheets = [(name, None) for name in wb.sheet_names()]
+            finally:
+                wb.release_resources()
+        return self.sheets
+
+    def iter_rows(self, sheet_name, first_col, last_col):
+        """Yields data rows (from row 2), converted XLS_ROW_BLOCK rows at a time.
+
+        Every column of a block is read with col_values(). Only cells whose
+        type needs it are converted the way openpyxl would: dates to
+        datetime (all dates of a block at once with NumPy), whole numbers to
+        int, empty cells to None. Text columns are used as read.
+        """
+        import numpy as np
+        import xlrd
+        date_type = xlrd.XL_CELL_DATE
+        number_type = xlrd.XL_CELL_NUMBER
+        text_type = xlrd.XL_CELL_TEXT
+        empty_types = (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK)
+
+        def read_column(sheet, col, start, end, datemode):
+            if col >= sheet.ncols:
+                return [None] * (end - start)
+            values = sheet.col_values(col, start, end)
+            types = sheet.col_types(col, start, end)
+            kinds = set(types)
+            if kinds <= {text_type}:
+                return values
+            if date_type in kinds:
+                # Whole days and the rest rounded to milliseconds, like xlrd.xldate_as_datetime
+                rows = [i for i, cell_type in enumerate(types) if cell_type == date_type]
+                serials = np.array([values[i] for i in rows])
+                days = np.floor(serials)
+                milliseconds = np.rint((serials - days) * 86400000.0)
+                if datemode == 0:
+                    # Excel counts the nonexistent 1900-02-29, serials before it start a day later
+                    days[(serials > 0) & (serials < 60)] += 1
+                epoch = np.datetime64("1904-01-01" if datemode == 1 else "1899-12-30", "ms")
+                dates = (epoch + days.astype("timedelta64[D]") + milliseconds.astype("timedelta64[ms]")).tolist()
+                for i, date in zip(rows, dates):
+                    values[i] = date
+                if kinds <= {text_type, date_type}:
+                    return values
+            for i, cell_type in enumerate(types):
+                if cell_type == text_type or cell_type == date_type:
+                    continue
+                value = values[i]
+                if cell_type == number_type:
+                    if value.is_integer():
+                        values[i] = int(value)
+                elif cell_type in empty_types:
+                    values[i] = None
+                elif cell_type == xlrd.XL_CELL_BOOLEAN:
+                    values[i] = bool(value)
+                elif cell_type == xlrd.XL_CELL_ERROR:
+                    values[i] = xlrd.error_text_from_code.get(value)
+            return values
+
+        wb = xlrd.open_workbook(self.file_path, on_demand=True)
+        try:
+            # xlrd loads a whole sheet, rows are converted block by block
+            sheet = wb.sheet_by_name(sheet_name)
+            for start in range(1, sheet.nrows, XLS_ROW_BLOCK):
+                end = min(start + XLS_ROW_BLOCK, sheet.nrows)
+                yield from zip(*[read_column(sheet, col, start, end, wb.datemode) for col in range(first_col, last_col + 1)])
+        finally:
+            wb.release_resources()
+
+
+class CsvReader:
+    """Reads CSV dumps as a workbook with a single sheet named CSV_SHEET_NAME."""
+
+    def __init__(self, file_path, encoding="utf-8-sig"):
+        self.file_path = file_path
+        self.encoding = encoding
+
+    def sheet_names(self):
+        return [CSV_SHEET_NAME]
+
+    def row_count(self, sheet_name):
+        return None
+
+    def list_sheets(self):
+        return [(CSV_SHEET_NAME, None)]
+
+    def iter_rows(self, sheet_name, first_col, last_col):
+        if sheet_name != CSV_SHEET_NAME:
+            raise KeyError(f"Worksheet {sheet_name} does not exist.")
+        width = last_col - first_col + 1
+        with open(self.file_path, newline="", encoding=self.encoding) as f:
+            # The header row is enough to tell which delimiter the dump uses
+            header = f.readline()
+            delimiter = max(CSV_DELIMITERS, key=header.count)
+            f.seek(0)
+            reader = csv.reader(f, delimiter=delimiter)
+            next(reader, None)
+            for row in reader:
+                window = [value if value != "" else None for value in row[first_col:last_col + 1]]
+                window += [None] * (width - len(window))
+                yield tuple(window)
+
+
+READERS = {
+    "xlsx": XlsxReader,
+    "xls": XlsReader,
+    "csv": CsvReader,
+}
+
+
+def register_reader(file_format, reader_class):
+    READERS[file_format] = reader_class
+
+
+def open_reader(file_path):
+    return READERS[detect_format(file_path)](file_path)
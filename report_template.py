@@ -0,0 +1,101 @@
+"""Named styles of the generated reports.
+
+Generated paragraphs only reference these styles, their look comes from
+the report template: a .docx with styles of the same names (Word gives
+"Lasarus Month" the id "LasarusMonth"). Styles missing from a template
+are added with the default look, so any .docx can be used as a template.
+Run this module to save the default template for editing in Word:
+
+    python report_template.py report_template.docx
+"""
+import sys
+import zipfile
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.shared import Pt, RGBColor
+
+
+MONTH_STYLE = "LasarusMonth"
+PERSON_STYLE = "LasarusPerson"
+DATE_STYLE = "LasarusDate"
+BODY_STYLE = "LasarusBody"
+LEAD_STYLE = "LasarusLead"
+
+HEADING_COLOR = RGBColor(47, 84, 150)
+
+
+def add_month_style(styles):
+    style = styles.add_style("Lasarus Month", WD_STYLE_TYPE.PARAGRAPH)
+    style.base_style = styles['Heading 1']
+    style.font.size = Pt(16)
+    style.font.name = "Calibri Light"
+    style.font.color.rgb = HEADING_COLOR
+    style.paragraph_format.space_before = Pt(12)
+    style.paragraph_format.space_after = Pt(6)
+
+
+def add_person_style(styles):
+    style = styles.add_style("Lasarus Person", WD_STYLE_TYPE.PARAGRAPH)
+    style.base_style = styles['Heading 2']
+    style.font.size = Pt(16)
+    style.font.name = "Calibri Light"
+    style.font.color.rgb = HEADING_COLOR
+    style.paragraph_format.space_before = Pt(6)
+    style.paragraph_format.space_after = Pt(0)
+
+
+def add_body_style(styles):
+    style = styles.add_style("Lasarus Body", WD_STYLE_TYPE.PARAGRAPH)
+    style.base_style = styles['Normal']
+    style.paragraph_format.first_line_indent = Pt(12)
+    style.paragraph_format.space_before = Pt(0)
+    style.paragraph_format.space_after = Pt(0)
+
+
+def add_date_style(styles):
+    style = styles.add_style("Lasarus Date", WD_STYLE_TYPE.PARAGRAPH)
+    style.base_style = styles['Lasarus Body']
+
+
+def add_lead_style(styles):
+    # First sentence of a result paragraph
+    style = styles.add_style("Lasarus Lead", WD_STYLE_TYPE.CHARACTER)
+    style.font.bold = True
+
+
+# In dependency order, the date style is based on the body style
+REPORT_STYLES = [
+    (MONTH_STYLE, add_month_style),
+    (PERSON_STYLE, add_person_style),
+    (BODY_STYLE, add_body_style),
+    (DATE_STYLE, add_date_style),
+    (LEAD_STYLE, add_lead_style),
+]
+
+
+def ensure_report_styles(document):
+    """Adds the report styles a python-docx Document does not define yet."""
+    style_ids = {style.style_id for style in document.styles}
+    for style_id, add_style in REPORT_STYLES:
+        if style_id not in style_ids:
+            add_style(document.styles)
+    return document
+
+
+def report_template(template=None):
+    """Document to write a report into: template (a path or None for the default) with the report styles."""
+    return ensure_report_styles(Document(template))
+
+
+def has_report_styles(docx_path):
+    """Checks the styles of a .docx without loading its (possibly large) body."""
+    with zipfile.ZipFile(docx_path) as archive:
+        try:
+            styles_xml = archive.read("word/styles.xml").decode("utf-8")
+        except KeyError:
+            return False
+    return all(f'w:styleId="{style_id}"' in styles_xml for style_id, _ in REPORT_STYLES)
+
+
+if __name__ == "__main__":
+    report_template().save(sys.argv[1] if len(sys.argv) > 1 else "report_template.docx")
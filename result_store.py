@@ -0,0 +1,123 @@
+import os
+import sqlite3
+from datetime import datetime
+from itertools import groupby, islice
+from result_table import SingleResult
+
+
+# Rows sent to SQLite per executemany call
+BATCH_SIZE = 5000
+
+
+def date_key(date):
+    # ISO text keeps the chronological order when compared as strings
+    return date.isoformat(sep=" ")
+
+
+class ResultStore:
+    """Gathered results normalized into SQLite for indexed date-range exports."""
+
+    def __init__(self, db_path="app_data.db"):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        # WAL lets the GUI keep reading while a background import writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.create_tables()
+
+    def close(self):
+        self.conn.close()
+
+    def create_tables(self):
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS Persons (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                Name TEXT UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS Results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                TestId INTEGER,
+                PersonId INTEGER REFERENCES Persons(id),
+                Date TEXT,
+                SourceFile TEXT,
+                SourceSheet TEXT
+            );
+            CREATE TABLE IF NOT EXISTS ResultInfo (
+                ResultId INTEGER REFERENCES Results(id) ON DELETE CASCADE,
+                Position INTEGER,
+                Value,
+                PRIMARY KEY (ResultId, Position)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS ResultsTestDate ON Results (TestId, Date);
+            CREATE INDEX IF NOT EXISTS ResultsSource ON Results (TestId, SourceFile, SourceSheet);
+        ''')
+        self.conn.commit()
+
+    def import_results(self, test_id, results, source_file, source_sheet, progress_callback=None):
+        """Replaces the results of a test imported earlier from the same sheet.
+
+        results is a ResultTable, SpilledResults or a list of SingleResult.
+        Everything is written in a single transaction with batched
+        executemany. Returns the number of imported results.
+        """
+        source_file = os.path.abspath(source_file)
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM Results WHERE TestId=? AND SourceFile=? AND SourceSheet=?",
+                (test_id, source_file, source_sheet))
+
+            # ResultTable and SpilledResults list their names
+            if hasattr(results, "names"):
+                names = {str(name) for name in results.names}
+            else:
+                names = {str(result.name) for result in results}
+            self.conn.executemany("INSERT OR IGNORE INTO Persons (Name) VALUES (?)", ((name,) for name in names))
+            person_ids = dict(self.conn.execute("SELECT Name, id FROM Persons"))
+
+            next_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM Results").fetchone()[0]
+            rows = iter(results)
+            for start in range(0, len(results), BATCH_SIZE):
+                batch = list(islice(rows, BATCH_SIZE))
+                ids = range(next_id + start, next_id + start + len(batch))
+                self.conn.executemany(
+                    "INSERT INTO Results (id, TestId, PersonId, Date, SourceFile, SourceSheet) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(result_id, test_id, person_ids[str(result.name)], date_key(result.date), source_file, source_sheet)
+                     for result_id, result in zip(ids, batch)])
+                self.conn.executemany(
+                    "INSERT INTO ResultInfo (ResultId, Position, Value) VALUES (?, ?, ?)",
+                    [(result_id, position, value)
+                     for result_id, result in zip(ids, batch)
+                     for position, value in enumerate(result.info)])
+                if progress_callback:
+                    progress_callback("storing", start + len(batch), len(results))
+        return len(results)
+
+    def range_condition(self, test_id, date_from, date_to):
+        condition = "r.TestId = ?"
+        params = [test_id]
+        if date_from:
+            condition += " AND r.Date >= ?"
+            params.append(date_key(date_from))
+        if date_to:
+            condition += " AND r.Date <= ?"
+            params.append(date_key(date_to))
+        return condition, params
+
+    def count_results(self, test_id, date_from=None, date_to=None):
+        condition, params = self.range_condition(test_id, date_from, date_to)
+        return self.conn.execute(f"SELECT COUNT(*) FROM Results r WHERE {condition}", params).fetchone()[0]
+
+    def iter_results(self, test_id, date_from=None, date_to=None):
+        """Streams SingleResult objects of a test sorted by (date, name)."""
+        condition, params = self.range_condition(test_id, date_from, date_to)
+        rows = self.conn.execute(f'''
+            SELECT r.id, r.Date, p.Name, i.Value FROM Results r
+            JOIN Persons p ON p.id = r.PersonId
+            JOIN ResultInfo i ON i.ResultId = r.id
+            WHERE {condition}
+            ORDER BY r.Date, p.Name, r.id, i.Position
+        ''', params)
+        for _, result_rows in groupby(rows, key=lambda row: row[0]):
+            result_rows = list(result_rows)
+            _, date, name, _ = result_rows[0]
+            yield SingleResult(name=name, date=datetime.fromisoformat(date), info=[row[3] for row in result_rows])
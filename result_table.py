@@ -0,0 +1,167 @@
+import sys
+from datetime import datetime, timedelta
+from typing import List
+import numpy as np
+
+
+uk_months = ["Січень", "Лютий", "Березень",
+     "Квітень",  "Травень",  "Червень",
+     "Липень",  "Серпень", "Вересень",
+     "Жовтень","Листопад","Грудень"]
+
+
+def month_title(date):
+    return f"{uk_months[date.month - 1]} {date.year}"
+
+
+class SingleResult:
+    # Without a __dict__ per result, lists of results take about half the memory
+    __slots__ = ("name", "date", "info")
+
+    def __init__(self, name: str, date: datetime, info: List[str]):
+        self.name = name
+        self.date = date
+        self.info = info
+
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def datetime_array(dates):
+    # Several times faster than np.array(dates, dtype="datetime64[us]"), which
+    # converts every datetime object through its slow generic path
+    micros = np.fromiter(((date - EPOCH) // MICROSECOND for date in dates), dtype=np.int64, count=len(dates))
+    return micros.view("datetime64[us]")
+
+
+def object_array(values):
+    # np.array() would turn lists or tuples among the values into extra dimensions
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def name_sort_key(name):
+    # Names are text, numbers sort in front of them instead of failing to compare
+    return (isinstance(name, str), name)
+
+
+# Memory taken by a collected result besides its data cells: the datetime,
+# the name code and the list slots
+RESULT_BYTES = 100
+
+
+class ResultTableBuilder:
+    """Collects parsed results column by column while a sheet is scanned."""
+
+    def __init__(self, data_column_count):
+        self.dates = []
+        self.name_codes = []
+        self.name_ids = {}
+        self.info = [[] for _ in range(data_column_count)]
+
+    def append(self, result):
+        self.dates.append(result.date)
+        # Names are interned, every row only keeps the code of its name
+        self.name_codes.append(self.name_ids.setdefault(result.name, len(self.name_ids)))
+        for column, value in zip(self.info, result.info):
+            column.append(value)
+
+    def estimated_bytes(self, sample_size=100):
+        """Rough memory taken by the collected results, data cells are measured on the last rows."""
+        rows = len(self.dates)
+        sample = range(max(rows - sample_size, 0), rows)
+        if not sample:
+            return 0
+        cell_bytes = sum(sys.getsizeof(column[i]) for column in self.info for i in sample)
+        # Interned names are counted once
+        name_bytes = sum(sys.getsizeof(name) for name in self.name_ids)
+        return rows * (RESULT_BYTES + 8 * len(self.info)) + cell_bytes * rows // len(sample) + name_bytes
+
+    def build(self):
+        names = list(self.name_ids)
+        # Codes are renumbered in name order, so they sort like the names
+        order = sorted(range(len(names)), key=lambda code: name_sort_key(names[code]))
+        ranks = np.empty(len(names), dtype=np.int64)
+        ranks[order] = np.arange(len(names))
+        return ResultTable(
+            datetime_array(self.dates),
+            ranks[np.array(self.name_codes, dtype=np.int64)] if names else np.empty(0, dtype=np.int64),
+            [names[code] for code in order],
+            [object_array(column) for column in self.info],
+        )
+
+
+class ResultTable:
+    """Results of one test structure stored as NumPy columns.
+
+    dates is a datetime64 array, name_codes index names (sorted, so codes
+    compare like the names) and info holds one object array per data
+    column. Sorting and grouping by month work on whole columns,
+    SingleResult objects are only created while a report is written.
+    """
+
+    def __init__(self, dates, name_codes, names, info):
+        self.dates = dates
+        self.name_codes = name_codes
+        self.names = names
+        self.info = info
+
+    @classmethod
+    def from_results(cls, results, data_column_count=None):
+        results = list(results)
+        if data_column_count is None:
+            data_column_count = len(results[0].info) if results else 0
+        builder = ResultTableBuilder(data_column_count)
+        for result in results:
+            builder.append(result)
+        return builder.build()
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __iter__(self):
+        return self.iter_results()
+
+    def take(self, indexes):
+        """Table of the rows at indexes (an index array, a mask or a slice)."""
+        return ResultTable(self.dates[indexes], self.name_codes[indexes], self.names,
+                           [column[indexes] for column in self.info])
+
+    def sorted(self):
+        """Table ordered by (date, name) as the reports list results."""
+        return self.take(np.lexsort((self.name_codes, self.dates)))
+
+    def last_date(self):
+        if not len(self):
+            return None
+        return self.dates.max().astype("datetime64[us]").item()
+
+    def group_bounds(self, unit="M"):
+        """[(start, stop)] of runs of rows in the same month ("M") or year ("Y")."""
+        periods = self.dates.astype(f"datetime64[{unit}]")
+        starts = np.flatnonzero(np.concatenate(([True], periods[1:] != periods[:-1]))) if len(self) else []
+        stops = list(starts[1:]) + [len(self)]
+        return [(int(start), int(stop)) for start, stop in zip(starts, stops)]
+
+    def iter_months(self):
+        """Yields (month title, table of the month) of a sorted table."""
+        for start, stop in self.group_bounds("M"):
+            part = self.take(slice(start, stop))
+            yield month_title(part.dates[0].astype("datetime64[us]").item()), part
+
+    def name_list(self):
+        return [self.names[code] for code in self.name_codes.tolist()]
+
+    def date_texts(self):
+        """Dates as "YYYY-MM-DD HH:MM:SS", formatted for the whole column at once."""
+        return [text.replace("T", " ") for text in np.datetime_as_string(self.dates, unit="s").tolist()]
+
+    def iter_results(self):
+        dates = self.dates.astype("datetime64[us]").tolist()
+        names = self.names
+        codes = self.name_codes.tolist()
+        info = [column.tolist() for column in self.info]
+        for i, date in enumerate(dates):
+            yield SingleResult(name=names[codes[i]], date=date, info=[column[i] for column in info])
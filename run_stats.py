@@ -0,0 +1,170 @@
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+class RowError(ValueError):
+    """A sheet row that could not be turned into a result."""
+
+    def __init__(self, row, column, reason, message):
+        super().__init__(message)
+        self.row = row
+        self.column = column
+        # "invalid_date", "missing_name", "missing_data" or "unexpected"
+        self.reason = reason
+
+
+class ErrorRecord:
+    def __init__(self, row, column, reason, message, source=None):
+        self.row = row
+        self.column = column
+        self.reason = reason
+        self.message = message
+        # Workbook of the row when several workbooks are merged into one report
+        self.source = source
+
+    def to_dict(self):
+        return {'source': self.source, 'row': self.row, 'column': self.column, 'reason': self.reason,
+                'message': self.message}
+
+
+def peak_memory():
+    """Peak resident memory of the process in bytes, None if unknown."""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def report_file_name(document_file_name, report_format):
+    # The run report is written next to the document, "report.docx" gets "report.report.json"
+    return os.path.splitext(document_file_name)[0] + ".report." + report_format
+
+
+class RunStats:
+    """Counters, per-stage wall time and error records of one LasarusResults run."""
+
+    def __init__(self):
+        self.stage_seconds = {}
+        self.rows_scanned = 0
+        self.rows_kept = 0
+        self.rows_filtered = 0
+        # Sorted runs written to disk when the results did not fit in memory
+        self.spilled_runs = 0
+        # Results dropped as copies of another one, from overlapping exports
+        self.rows_duplicate = 0
+        self.errors = []
+        self.peak_memory = None
+        # Called as stage_callback(stage, seconds) when a stage ends
+        self.stage_callback = None
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0) + seconds
+            self.peak_memory = peak_memory()
+            if self.stage_callback:
+                self.stage_callback(name, seconds)
+
+    def add_error(self, row, column, reason, message):
+        self.errors.append(ErrorRecord(row, column, reason, message))
+
+    def drop_duplicate_errors(self):
+        # Structures sharing a column report its bad cells once each, and rows
+        # scanned again after a stale watermark report their errors twice
+        unique = {(error.source, error.row, error.column, error.reason): error for error in self.errors}
+        self.errors = sorted(unique.values(), key=lambda error: (error.source or "", error.row))
+
+    def merge(self, other, source=None):
+        """Adds the counters and errors of a run over another workbook, stage times are not added."""
+        self.rows_scanned += other.rows_scanned
+        self.rows_kept += other.rows_kept
+        self.rows_filtered += other.rows_filtered
+        self.spilled_runs += other.spilled_runs
+        self.rows_duplicate += other.rows_duplicate
+        for error in other.errors:
+            error.source = source
+            self.errors.append(error)
+
+    def error_row_count(self):
+        # A row failing in several structures or columns has several error records
+        return len({(error.source, error.row) for error in self.errors})
+
+    def errors_by_reason(self):
+        return dict(Counter(error.reason for error in self.errors))
+
+    def to_dict(self):
+        return {
+            'stage_seconds': self.stage_seconds,
+            'rows_scanned': self.rows_scanned,
+            'rows_kept': self.rows_kept,
+            'rows_filtered': self.rows_filtered,
+            'spilled_runs': self.spilled_runs,
+            'rows_duplicate': self.rows_duplicate,
+            'error_rows': self.error_row_count(),
+            'errors_by_reason': self.errors_by_reason(),
+            'peak_memory': self.peak_memory,
+            'errors': [error.to_dict() for error in self.errors],
+        }
+
+    def summary(self):
+        lines = [
+            f"Рядків прочитано: {self.rows_scanned}, збережено: {self.rows_kept}, "
+            f"відфільтровано за датою: {self.rows_filtered}, з помилками: {self.error_row_count()}",
+        ]
+        reason_names = {"invalid_date": "некоректна дата", "missing_name": "немає імені",
+                        "missing_data": "немає даних", "unexpected": "інше"}
+        if self.errors:
+            lines.append(", ".join(f"{reason_names.get(reason, reason)}: {count}"
+                                   for reason, count in self.errors_by_reason().items()))
+        if self.rows_duplicate:
+            lines.append(f"Пропущено дублікатів: {self.rows_duplicate}")
+        if self.spilled_runs:
+            lines.append(f"Результати не вмістилися в пам'ять, відсортовано на диску частинами: {self.spilled_runs}")
+        stage_names = {"reading": "читання", "sorting": "сортування", "storing": "запис у базу",
+                       "composing": "формування", "writing": "запис"}
+        lines.append(", ".join(f"{stage_names.get(stage, stage)}: {seconds:.2f} с"
+                               for stage, seconds in self.stage_seconds.items()))
+        if self.peak_memory:
+            lines.append(f"Пікова пам'ять: {self.peak_memory / 1024 / 1024:.0f} МБ")
+        return "\n".join(lines)
+
+    def write(self, file_name):
+        """Writes the whole report as .json, or the error records as .csv."""
+        if file_name.lower().endswith(".csv"):
+            with open(file_name, "w", newline="", encoding="utf-8-sig") as f:
+                writer = csv.DictWriter(f, fieldnames=['source', 'row', 'column', 'reason', 'message'])
+                writer.writeheader()
+                writer.writerows(error.to_dict() for error in self.errors)
+        else:
+            with open(file_name, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
@@ -0,0 +1,166 @@
+import re
+from itertools import islice
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PySide6.QtGui import QColor
+from lasarus import LasarusResults
+from readers import open_reader
+
+
+# Sheet rows read per fetchMore call
+CHUNK_SIZE = 200
+# Columns shown while the structure has no valid columns
+DEFAULT_COLUMNS = 26
+COLUMN_PATTERN = re.compile("^[A-Za-z]{1,3}$")
+
+ROLE_NAMES = {"name": "ім'я", "date": "дата", "data": "дані"}
+ROLE_COLORS = {"name": QColor(255, 236, 179), "date": QColor(200, 230, 201), "data": QColor(187, 222, 251)}
+ERROR_COLOR = QColor(198, 40, 40)
+
+
+def column_letter(index):
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+class SheetPreviewModel(QAbstractTableModel):
+    """Sheet rows fetched from a read-only reader in chunks as the view scrolls.
+
+    The first column shows how every row parses with the current structure,
+    the structure's columns are highlighted. Only the fetched rows of the
+    structure's column window are kept in memory.
+    """
+
+    def __init__(self, file_path, sheet_name, parent=None):
+        super().__init__(parent)
+        self.reader = open_reader(file_path)
+        self.sheet_name = sheet_name
+        self.lasarus_results = LasarusResults(self.reader)
+        self.row_iter = None
+        self.rows = []
+        self.parsed = []
+        self.roles = {}
+        self.parser = None
+        self.first_col = 0
+        self.last_col = DEFAULT_COLUMNS - 1
+        self.restart()
+
+    def close(self):
+        if self.row_iter is not None:
+            # Closing the generator closes the workbook it reads
+            self.row_iter.close()
+            self.row_iter = None
+
+    def structure_roles(self, structure):
+        """{0-based column: role} of a structure, None if any column is not a valid letter."""
+        columns = [("name", structure['name_column']), ("date", structure['date_column'])]
+        columns += [("data", column) for column in structure['data_columns'].split(',')]
+        roles = {}
+        for role, column in columns:
+            column = column.strip()
+            if not COLUMN_PATTERN.match(column):
+                return None
+            roles.setdefault(self.lasarus_results.cell_by_name(column), role)
+        return roles
+
+    def set_structure(self, structure):
+        """Shows the sheet the way the structure (possibly half typed) reads it."""
+        roles = self.structure_roles(structure)
+        self.beginResetModel()
+        if roles:
+            self.roles = roles
+            self.first_col = min(roles)
+            self.last_col = max(roles)
+            date_index, name_index, data_columns, data_indexes = self.lasarus_results.column_layout(structure)
+            self.parser = (date_index - self.first_col, name_index - self.first_col, data_columns,
+                           [index - self.first_col for index in data_indexes],
+                           structure['date_column'], structure['name_column'])
+        else:
+            self.roles = {}
+            self.parser = None
+            self.first_col = 0
+            self.last_col = DEFAULT_COLUMNS - 1
+        self.restart()
+        self.endResetModel()
+
+    def restart(self):
+        self.close()
+        self.rows = []
+        self.parsed = []
+        self.row_iter = self.reader.iter_rows(self.sheet_name, self.first_col, self.last_col)
+
+    def parse(self, row_idx, row):
+        """Returns (text, tooltip, failed) describing the row's SingleResult."""
+        if self.parser is None:
+            return "", "", False
+        try:
+            result = self.lasarus_results.parse_row(row_idx, row, *self.parser)
+        except Exception as e:
+            return str(e), str(e), True
+        text = f"{result.name} · {result.date:%d-%m-%Y %H:%M}"
+        if result.info:
+            text += f" · {str(result.info[0])[:40]}"
+        return text, "\n".join(str(value) for value in result.info), False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.last_col - self.first_col + 2
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.row_iter is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.row_iter is None:
+            return
+        chunk = list(islice(self.row_iter, CHUNK_SIZE))
+        if len(chunk) < CHUNK_SIZE:
+            self.close()
+        if not chunk:
+            return
+        start = len(self.rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(chunk) - 1)
+        for row_idx, row in enumerate(chunk, start=start + 2):
+            self.rows.append(row)
+            self.parsed.append(self.parse(row_idx, row))
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = index.column()
+        if column == 0:
+            text, tooltip, failed = self.parsed[index.row()]
+            if role == Qt.DisplayRole:
+                return text
+            if role == Qt.ToolTipRole:
+                return tooltip
+            if role == Qt.ForegroundRole and failed:
+                return ERROR_COLOR
+            return None
+
+        sheet_column = self.first_col + column - 1
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            value = self.rows[index.row()][column - 1]
+            return "" if value is None else str(value)
+        if role == Qt.BackgroundRole and sheet_column in self.roles:
+            return ROLE_COLORS[self.roles[sheet_column]]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Vertical:
+            # Data rows start at sheet row 2
+            return str(section + 2)
+        if section == 0:
+            return "Розбір"
+        sheet_column = self.first_col + section - 1
+        letter = column_letter(sheet_column)
+        if sheet_column in self.roles:
+            return f"{letter} ({ROLE_NAMES[self.roles[sheet_column]]})"
+        return letter
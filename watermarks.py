@@ -0,0 +1,113 @@
+import hashlib
+import os
+from datetime import datetime
+
+
+class Watermark:
+    """How far a sheet has already been exported for one test structure."""
+
+    def __init__(self, last_row, last_date, fingerprint, columns, failed_rows=()):
+        self.last_row = last_row
+        self.last_date = last_date
+        # sha1 of the structure's cells in rows 2..last_row, without failed_rows
+        self.fingerprint = fingerprint
+        # The structure's columns, a changed mapping invalidates the watermark
+        self.columns = columns
+        # Rows up to last_row that could not be parsed, parsed again by the next export
+        self.failed_rows = list(failed_rows)
+
+
+def structure_columns(structure):
+    return f"{structure['name_column']}|{structure['date_column']}|{structure['data_columns']}"
+
+
+class RowFingerprint:
+    """Hashes the structure's cells row by row while a sheet is scanned.
+
+    Rows that failed to parse are left out of the hash and kept in
+    failed_rows, so fixing them in the sheet does not invalidate the
+    watermark and the next export parses them again.
+    """
+
+    def __init__(self, positions, watermark=None):
+        self.positions = positions
+        self.watermark = watermark
+        self.skip_until = watermark.last_row if watermark else 1
+        self.retry_rows = set(watermark.failed_rows) if watermark else set()
+        self.hasher = hashlib.sha1()
+        # Rows up to the watermark hashed the way the watermark was, without
+        # its failed rows, whether they parse now or not
+        self.prefix_hasher = hashlib.sha1()
+        self.prefix_fingerprint = None
+        self.failed_rows = []
+        self.last_row = 1
+
+    def add(self, row_idx, row, failed=False):
+        cells = repr([row[pos] for pos in self.positions]).encode("utf-8")
+        if failed:
+            self.failed_rows.append(row_idx)
+        else:
+            self.hasher.update(cells)
+        if row_idx <= self.skip_until and row_idx not in self.retry_rows:
+            self.prefix_hasher.update(cells)
+        self.last_row = row_idx
+        if row_idx == self.skip_until:
+            self.prefix_fingerprint = self.prefix_hasher.hexdigest()
+
+    def is_new(self, row_idx):
+        return row_idx > self.skip_until or row_idx in self.retry_rows
+
+    def matches(self):
+        """True if the rows covered by the watermark did not change."""
+        if self.watermark is None:
+            return True
+        if self.skip_until <= 1:
+            return True
+        return self.prefix_fingerprint == self.watermark.fingerprint
+
+    def next_watermark(self, last_date, columns):
+        """Watermark after this scan, last_date is the newest exported result's date."""
+        dates = [last_date] if last_date else []
+        if self.watermark and self.matches() and self.watermark.last_date:
+            dates.append(self.watermark.last_date)
+        return Watermark(self.last_row, max(dates) if dates else None, self.hasher.hexdigest(), columns,
+                         self.failed_rows)
+
+
+def create_watermarks_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ExportWatermarks (
+            FilePath TEXT,
+            SheetName TEXT,
+            StructureId INTEGER,
+            LastRow INTEGER,
+            LastDate TEXT,
+            Fingerprint TEXT,
+            Columns TEXT,
+            FailedRows TEXT,
+            PRIMARY KEY (FilePath, SheetName, StructureId)
+        )
+    ''')
+
+
+def load_watermark(cursor, file_path, sheet_name, structure_id):
+    cursor.execute('''
+        SELECT LastRow, LastDate, Fingerprint, Columns, FailedRows FROM ExportWatermarks
+        WHERE FilePath=? AND SheetName=? AND StructureId=?
+    ''', (os.path.abspath(file_path), sheet_name, structure_id))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    last_date = datetime.fromisoformat(row[1]) if row[1] else None
+    failed_rows = [int(row_idx) for row_idx in row[4].split(",")] if row[4] else []
+    return Watermark(row[0], last_date, row[2], row[3], failed_rows)
+
+
+def save_watermark(cursor, file_path, sheet_name, structure_id, watermark):
+    last_date = watermark.last_date.isoformat() if watermark.last_date else None
+    cursor.execute('''
+        INSERT OR REPLACE INTO ExportWatermarks
+            (FilePath, SheetName, StructureId, LastRow, LastDate, Fingerprint, Columns, FailedRows)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (os.path.abspath(file_path), sheet_name, structure_id, watermark.last_row, last_date,
+          watermark.fingerprint, watermark.columns, ",".join(map(str, watermark.failed_rows))))
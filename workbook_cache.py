@@ -0,0 +1,149 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from readers import list_sheets, open_reader
+
+
+# Default memory budget for cached rows
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Rows used to estimate the memory taken by a cached sheet
+SIZE_SAMPLE_ROWS = 200
+
+
+def file_key(file_path):
+    stat = os.stat(file_path)
+    return (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+
+
+def estimate_size(rows):
+    if not rows:
+        return sys.getsizeof(rows)
+    sample = rows[:SIZE_SAMPLE_ROWS]
+    sample_size = sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in sample)
+    return sys.getsizeof(rows) + sample_size * len(rows) // len(sample)
+
+
+class CachedSheet:
+    def __init__(self, first_col, last_col, rows):
+        self.first_col = first_col
+        self.last_col = last_col
+        self.rows = rows
+        self.size = estimate_size(rows)
+
+    def covers(self, first_col, last_col):
+        return self.first_col <= first_col and last_col <= self.last_col
+
+    def window(self, first_col, last_col):
+        if (first_col, last_col) == (self.first_col, self.last_col):
+            return self.rows
+        start = first_col - self.first_col
+        stop = last_col - self.first_col + 1
+        return (row[start:stop] for row in self.rows)
+
+
+class WorkbookCache:
+    """LRU cache of sheet metadata and extracted rows.
+
+    Entries are keyed by (path, mtime, size, sheet), so a file changed on disk
+    is read again. Rows are kept as the widest column window requested so far,
+    which lets several test structures share one read of the sheet.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.sheets = OrderedDict()
+        self.metadata = OrderedDict()
+        self.lock = threading.RLock()
+
+    def list_sheets(self, file_path):
+        key = file_key(file_path)
+        with self.lock:
+            if key in self.metadata:
+                self.metadata.move_to_end(key)
+                return self.metadata[key]
+        sheets = list_sheets(file_path)
+        with self.lock:
+            self.metadata[key] = sheets
+            # Metadata is tiny, only keep it bounded
+            while len(self.metadata) > 64:
+                self.metadata.popitem(last=False)
+        return sheets
+
+    def get_rows(self, file_path, sheet_name, first_col, last_col):
+        """Yields the rows of a column window, from the cache or streamed from the file.
+
+        Rows read from the file are collected for the cache while they fit in
+        max_bytes, a bigger sheet is only streamed.
+        """
+        key = file_key(file_path) + (sheet_name,)
+        read_first_col, read_last_col = first_col, last_col
+        with self.lock:
+            cached = self.sheets.get(key)
+            hit = cached is not None and cached.covers(first_col, last_col)
+            if hit:
+                self.sheets.move_to_end(key)
+            elif cached:
+                # Read once more with a window wide enough for both requests
+                read_first_col = min(first_col, cached.first_col)
+                read_last_col = max(last_col, cached.last_col)
+        if hit:
+            yield from cached.window(first_col, last_col)
+            return
+
+        start = first_col - read_first_col
+        stop = last_col - read_first_col + 1
+        sliced = (start, stop) != (0, read_last_col - read_first_col + 1)
+        rows = []
+        sample_size = 0
+        for row in open_reader(file_path).iter_rows(sheet_name, read_first_col, read_last_col):
+            yield row[start:stop] if sliced else row
+            if rows is None:
+                continue
+            rows.append(row)
+            if len(rows) <= SIZE_SAMPLE_ROWS:
+                sample_size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+            if sample_size * len(rows) // min(len(rows), SIZE_SAMPLE_ROWS) > self.max_bytes:
+                # Too big to be cached, the rest is only streamed
+                rows = None
+        if rows is not None:
+            self.put(key, CachedSheet(read_first_col, read_last_col, rows))
+
+    def put(self, key, entry):
+        with self.lock:
+            if key in self.sheets:
+                self.total_bytes -= self.sheets.pop(key).size
+            if entry.size > self.max_bytes:
+                return
+            self.sheets[key] = entry
+            self.total_bytes += entry.size
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self.sheets.popitem(last=False)
+                self.total_bytes -= evicted.size
+
+    def clear(self):
+        with self.lock:
+            self.sheets.clear()
+            self.metadata.clear()
+            self.total_bytes = 0
+
+
+class CachedWorkbook:
+    """Source for LasarusResults that serves rows from a WorkbookCache."""
+
+    def __init__(self, file_path, cache):
+        self.file_path = file_path
+        self.cache = cache
+
+    def sheet_names(self):
+        return [name for name, _ in self.cache.list_sheets(self.file_path)]
+
+    def row_count(self, sheet_name):
+        return dict(self.cache.list_sheets(self.file_path)).get(sheet_name)
+
+    def iter_rows(self, sheet_name, first_col, last_col):
+        return self.cache.get_rows(self.file_path, sheet_name, first_col, last_col)
+
+
+workbook_cache = WorkbookCache()